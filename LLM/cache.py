@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from common import metrics
+
+CACHE_LOOKUPS = metrics.counter("ethqna_llm_cache_lookups_total", "LLM cache lookups by result.", ("result",))
+CACHE_EVICTIONS = metrics.counter("ethqna_llm_cache_evictions_total", "LLM cache entries evicted from disk.")
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def content_hash(input_str: str) -> str:
+    """
+    Hash an LLM input the way providers interpret it: an existing file path
+    is hashed by its bytes, anything else as text.
+    """
+    if isinstance(input_str, (bytes, bytearray)):
+        return hashlib.sha256(input_str).hexdigest()
+    if os.path.exists(input_str):
+        digest = hashlib.sha256()
+        with open(input_str, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    return sha256_text(input_str)
+
+def make_key(provider: str, model: str, prompt: str, input_hash: str) -> str:
+    return sha256_text(json.dumps([provider, model, sha256_text(prompt), input_hash]))
+
+class LLMCache:
+    """
+    Two-tier cache for LLM responses: an in-process LRU in front of a SQLite
+    file shared by every process on the host. Disk entries expire after
+    `ttl_seconds` and the least recently used ones are evicted once the file
+    holds more than `max_disk_bytes` of responses. Values must be JSON
+    serializable.
+
+    The size of the file is tracked as a running total, so a write does not
+    scan the table; expired entries are swept and the total recounted (it
+    drifts with other processes' writes) every `SWEEP_EVERY` writes, or
+    when the total passes the limit. Eviction then goes down to
+    `LOW_WATER` of the limit, so it does not run again on the next write.
+    """
+
+    SWEEP_EVERY = 100
+    LOW_WATER = 0.9
+
+    def __init__(self, path: str, memory_items: int = 256, max_disk_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: float = 30 * 24 * 3600):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._disk_bytes = None  # running total of stored sizes; None until first counted
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, stored_at: float, value):
+        with self._lock:
+            self._memory[key] = (stored_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+        CACHE_LOOKUPS.inc(result=stat)
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                CACHE_LOOKUPS.inc(result="memory_hits")
+                return entry[1]
+
+        conn = self._conn()
+        row = conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            if row is not None:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._count("misses")
+            return None
+        conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        value = json.loads(row[0])
+        self._remember(key, row[1], value)
+        self._count("disk_hits")
+        return value
+
+    def set(self, key: str, value):
+        now = time.time()
+        serialized = json.dumps(value)
+        self._remember(key, now, value)
+        conn = self._conn()
+        previous = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, serialized, len(serialized), now, now),
+        )
+        with self._lock:
+            self._writes += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(serialized) - (previous[0] if previous else 0)
+            sweep = (self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+                     or self._writes % self.SWEEP_EVERY == 0)
+        if sweep:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        evicted = 0
+        if total > self.max_disk_bytes:
+            target = self.max_disk_bytes * self.LOW_WATER
+            for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed").fetchall():
+                if total <= target:
+                    break
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self.stats["evictions"] += evicted
+        if evicted:
+            CACHE_EVICTIONS.inc(evicted)
+
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_items"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+class CachedLLMService:
+    """
+    Wraps any provider's LLMService so that summarize, generate_metadata and
+    analyze are answered from an LLMCache when the provider, model, prompt
+    template and input content have been seen before. Other attributes are
+    passed through to the wrapped service.
+    """
+
+    def __init__(self, service, cache: LLMCache, provider_name: str, prompts: dict):
+        self.service = service
+        self.cache = cache
+        self.provider_name = provider_name
+        self.model = getattr(service, "model", None) or provider_name
+        self.prompts = prompts  # operation -> prompt template used by the provider
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    def _cached(self, operation: str, input_str: str, compute, fallback: bool = False):
+        # Fallback answers come from different calls (and possibly another
+        # model), so they are cached apart from the primary ones.
+        model = f"{self.model}:fallback" if fallback else self.model
+        key = make_key(self.provider_name, model, self.prompts.get(operation, operation), content_hash(input_str))
+        return self.cache.get_or_compute(key, compute)
+
+    def summarize(self, input_str: str) -> str:
+        return self._cached("summarize", input_str, lambda: self.service.summarize(input_str))
+
+    def generate_metadata(self, input_str: str) -> dict:
+        return self._cached("generate_metadata", input_str, lambda: self.service.generate_metadata(input_str))
+
+    def analyze(self, input_str: str, fallback: bool = False) -> dict:
+        return self._cached("analyze", input_str, lambda: self.service.analyze(input_str, fallback=fallback),
+                            fallback=fallback)
+
+def open_cache(config: dict, base_dir: str = "."):
+    """Build the LLMCache described by the `llm_cache` config section, or None if disabled."""
+    cache_config = config.get("llm_cache", {}) or {}
+    if not cache_config.get("enabled", True):
+        return None
+    return LLMCache(
+        os.path.join(base_dir, cache_config.get("path", "data/llm_cache.db")),
+        memory_items=cache_config.get("memory_items", 256),
+        max_disk_bytes=int(cache_config.get("max_disk_mb", 256)) * 1024 * 1024,
+        ttl_seconds=float(cache_config.get("ttl_hours", 720)) * 3600,
+    )
@@ -0,0 +1,220 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+
+from common import metrics
+
+LLM_RETRIES = metrics.counter("ethqna_llm_retries_total", "LLM requests retried after 429/5xx.", ("model",))
+
+def is_retryable(exc: Exception) -> bool:
+    """Rate limiting (429), server errors (5xx) and dropped connections are worth retrying."""
+    for attr in ("code", "status_code", "status"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int):
+            return code == 429 or 500 <= code < 600
+    return isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError))
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        # Only ever used from the gateway's event loop, so no lock is needed
+        # between checking and taking a token.
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class LLMGateway:
+    """
+    Process-wide entry point for LLM requests.
+
+    The gateway runs its own event loop in a daemon thread. Every request,
+    whether it comes from a sync caller (Flask views, ingestion threads) or
+    an async one (FastAPI routes on another loop), is executed on that loop,
+    so one set of limits applies to all of them: a global concurrency cap, a
+    per-model cap, a token bucket for request rate, and retries with
+    jittered exponential backoff on 429/5xx errors. Callers pass a factory
+    returning the provider's coroutine (or async iterator for streams).
+    """
+
+    def __init__(self, max_concurrency: int = 8, model_concurrency: dict = None,
+                 default_model_concurrency: int = 4, requests_per_minute: float = 120, burst: int = 10,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency or {}
+        self.default_model_concurrency = default_model_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._global = None
+        self._per_model = {}
+        self.stats = {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0, "waiting": 0}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+
+    def _semaphores(self, model: str):
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrency)
+        if model not in self._per_model:
+            limit = self.model_concurrency.get(model, self.default_model_concurrency)
+            self._per_model[model] = asyncio.Semaphore(limit)
+        return self._global, self._per_model[model]
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": a random delay up to the exponential bound.
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def _slot(self, model: str):
+        global_sem, model_sem = self._semaphores(model)
+        self.stats["waiting"] += 1
+        try:
+            await global_sem.acquire()
+            try:
+                await model_sem.acquire()
+            except BaseException:
+                global_sem.release()
+                raise
+            try:
+                await self._bucket.acquire()
+            except BaseException:
+                model_sem.release()
+                global_sem.release()
+                raise
+        finally:
+            self.stats["waiting"] -= 1
+        self.stats["in_flight"] += 1
+        self.stats["requests"] += 1
+
+        def release():
+            self.stats["in_flight"] -= 1
+            model_sem.release()
+            global_sem.release()
+        return release
+
+    async def _limited(self, model: str, factory, operation: str = "generate", provider: str = ""):
+        with metrics.LLM_CALL_SECONDS.time(provider=provider, operation=operation, model=model):
+            return await self._attempts(model, factory)
+
+    async def _attempts(self, model: str, factory):
+        attempt = 0
+        while True:
+            release = await self._slot(model)
+            try:
+                return await factory()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.stats["errors"] += 1
+                    metrics.ERRORS.inc(component="llm")
+                    raise
+            finally:
+                release()
+            attempt += 1
+            self.stats["retries"] += 1
+            LLM_RETRIES.inc(model=model)
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def _limited_stream(self, model: str, factory, emit, operation: str = "stream", provider: str = ""):
+        with metrics.LLM_CALL_SECONDS.time(provider=provider, operation=operation, model=model):
+            await self._stream_attempts(model, factory, emit)
+
+    async def _stream_attempts(self, model: str, factory, emit):
+        attempt = 0
+        while True:
+            release = await self._slot(model)
+            started = False
+            try:
+                async for chunk in factory():
+                    started = True
+                    emit(chunk)
+                return
+            except Exception as e:
+                # Once output has reached the caller a retry would duplicate it.
+                if started or attempt >= self.max_retries or not is_retryable(e):
+                    self.stats["errors"] += 1
+                    metrics.ERRORS.inc(component="llm")
+                    raise
+            finally:
+                release()
+            attempt += 1
+            self.stats["retries"] += 1
+            LLM_RETRIES.inc(model=model)
+            await asyncio.sleep(self._backoff(attempt))
+
+    def call(self, model: str, factory, operation: str = "generate", provider: str = ""):
+        """Run a request from synchronous code and return its result."""
+        coroutine = self._limited(model, factory, operation, provider)
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def acall(self, model: str, factory, operation: str = "generate", provider: str = ""):
+        """Run a request from a coroutine on any event loop."""
+        future = asyncio.run_coroutine_threadsafe(self._limited(model, factory, operation, provider), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def stream(self, model: str, factory, operation: str = "stream", provider: str = ""):
+        """Yield the chunks of a streamed request to synchronous code as they arrive."""
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                await self._limited_stream(model, factory, chunks.put, operation, provider)
+                chunks.put(done)
+            except BaseException as e:
+                chunks.put(e)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def snapshot(self):
+        return dict(self.stats)
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def configure_gateway(limits: dict = None) -> LLMGateway:
+    """
+    Create the process-wide gateway from the `llm_limits` config section.
+    Only the first call has an effect; later calls return the same gateway.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            limits = limits or {}
+            _gateway = LLMGateway(
+                max_concurrency=limits.get("max_concurrency", 8),
+                model_concurrency=limits.get("model_concurrency", {}),
+                default_model_concurrency=limits.get("default_model_concurrency", 4),
+                requests_per_minute=limits.get("requests_per_minute", 120),
+                burst=limits.get("burst", 10),
+                max_retries=limits.get("max_retries", 4),
+                base_delay=limits.get("base_delay_seconds", 1.0),
+                max_delay=limits.get("max_delay_seconds", 30.0),
+            )
+        return _gateway
+
+def get_gateway() -> LLMGateway:
+    return configure_gateway()
@@ -2,8 +2,105 @@
 
 from abc import ABC, abstractmethod
 
+from LLM.gateway import get_gateway
+
+def validate_analysis(data) -> dict:
+    """
+    Check and normalize the result of LLMService.analyze. Raises ValueError
+    if the summary is missing or a field has the wrong type.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Analysis must be a JSON object, got {type(data).__name__}")
+    summary = data.get("summary")
+    if not isinstance(summary, str) or not summary.strip():
+        raise ValueError("Analysis is missing a non-empty 'summary'")
+
+    title = data.get("title")
+    if title is not None and not isinstance(title, str):
+        raise ValueError("'title' must be a string")
+    date = data.get("date")
+    if date is not None and not isinstance(date, str):
+        raise ValueError("'date' must be a string or null")
+
+    lists = {}
+    for field in ("authors", "tags"):
+        value = data.get(field) or []
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise ValueError(f"'{field}' must be a list of strings")
+        lists[field] = value
+
+    return {
+        "summary": summary,
+        "title": title or "Unknown Title",
+        "date": date,
+        "authors": lists["authors"],
+        "tags": lists["tags"],
+    }
+
 class LLMService(ABC):
+    """
+    Base class for providers. Providers implement the raw async calls
+    (_agenerate_raw, and _astream_raw for streaming); the public generate,
+    agenerate and stream methods send them through the process-wide
+    LLMGateway so every call shares its concurrency, rate and retry limits.
+
+    `contents` is a list of prompt parts: str for text, bytes for a PDF.
+    `operation` only labels the call in the LLM latency metrics.
+    """
+
+    provider_name = "base"
+    model = None
+
+    @abstractmethod
+    async def _agenerate_raw(self, contents, model: str, system_instruction: str = None,
+                             json_output: bool = False) -> str:
+        """Make one model call and return the response text."""
+        pass
+
+    async def _astream_raw(self, contents, model: str, system_instruction: str = None):
+        """Yield response text chunks; providers without streaming yield one chunk."""
+        yield await self._agenerate_raw(contents, model, system_instruction)
+
+    def generate(self, contents, model: str = None, system_instruction: str = None,
+                 json_output: bool = False, operation: str = "generate") -> str:
+        model = model or self.model
+        return get_gateway().call(
+            model, lambda: self._agenerate_raw(contents, model, system_instruction, json_output),
+            operation=operation, provider=self.provider_name,
+        )
+
+    async def agenerate(self, contents, model: str = None, system_instruction: str = None,
+                        json_output: bool = False, operation: str = "generate") -> str:
+        model = model or self.model
+        return await get_gateway().acall(
+            model, lambda: self._agenerate_raw(contents, model, system_instruction, json_output),
+            operation=operation, provider=self.provider_name,
+        )
+
+    def stream(self, contents, model: str = None, system_instruction: str = None, operation: str = "stream"):
+        model = model or self.model
+        return get_gateway().stream(
+            model, lambda: self._astream_raw(contents, model, system_instruction),
+            operation=operation, provider=self.provider_name,
+        )
+
     @abstractmethod
     def summarize(self, text: str) -> str:
         """Summarize the given text and return a short description."""
         pass
+
+    def generate_metadata(self, text: str) -> dict:
+        """Extract title, authors, date and tags from the given text or PDF."""
+        raise NotImplementedError
+
+    def analyze(self, document: str, fallback: bool = False) -> dict:
+        """
+        Return summary, title, authors, date and tags for a document (PDF
+        path or text), validated by validate_analysis. Providers override
+        this with a single model call; this default makes the two separate
+        calls and is also what `fallback=True` falls back to.
+        """
+        metadata = self.generate_metadata(document)
+        return validate_analysis({**metadata, "summary": self.summarize(document)})
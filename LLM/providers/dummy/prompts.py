@@ -0,0 +1,4 @@
+# The dummy provider answers this prompt with the candidates in the order
+# given, so /query/select_advanced exercises the LLM rerank path offline.
+RERANK_DOCUMENTS_PROMPT = """Dummy rerank: top {top_n} for "{query}"
+{documents_json}"""
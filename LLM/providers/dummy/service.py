@@ -1,9 +1,95 @@
+import asyncio
+import json
+import os
 import pathlib
+import re
+
+from LLM.interface import LLMService as BaseLLMService, validate_analysis
+
+WORDS = ("ethereum protocol validator consensus rollup proposal network client "
+         "specification upgrade research block state transaction fee data").split()
+
+# Matches RERANK_DOCUMENTS_PROMPT in prompts.py.
+RERANK_RE = re.compile(r'^Dummy rerank: top (\d+) for ".*?"\n(\[.*\])$', re.S)
+
+def _rerank(prompt: str):
+    """Ranking output for a rerank prompt: the candidates in the order given, or None."""
+    match = RERANK_RE.match(prompt)
+    if not match:
+        return None
+    candidates = json.loads(match.group(2))
+    top_n = int(match.group(1))
+    return [{"id": doc["id"], "relevance": round(1 - i / len(candidates), 4)}
+            for i, doc in enumerate(candidates[:top_n])]
+
+class LLMService(BaseLLMService):
+    """
+    Offline stand-in for a real provider. Every call goes through the LLM
+    gateway like a real one and takes `latency_ms` (DUMMY_LLM_LATENCY_MS),
+    producing about `output_chars` (DUMMY_LLM_OUTPUT_CHARS) of text, so
+    benchmarks can model a provider's speed without network access.
+    """
+
+    provider_name = "dummy"
+    model = "dummy"
+
+    def __init__(self, latency_ms: float = None, output_chars: int = None):
+        if latency_ms is None:
+            latency_ms = float(os.getenv("DUMMY_LLM_LATENCY_MS", "0"))
+        if output_chars is None:
+            output_chars = int(os.getenv("DUMMY_LLM_OUTPUT_CHARS", "0"))
+        self.latency = latency_ms / 1000.0
+        self.output_chars = output_chars
+
+    def _text(self, size: int) -> str:
+        words = []
+        length = 0
+        while length < self.output_chars:
+            word = WORDS[len(words) % len(WORDS)]
+            words.append(word)
+            length += len(word) + 1
+        prefix = f"Dummy response: The input is {size} characters/bytes in size."
+        return " ".join([prefix] + words)
+
+    async def _agenerate_raw(self, contents, model: str, system_instruction: str = None,
+                             json_output: bool = False) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if json_output and isinstance(contents[-1], str):
+            ranking = _rerank(contents[-1])
+            if ranking is not None:
+                return json.dumps(ranking)
+        text = self._text(sum(len(part) for part in contents))
+        if json_output:
+            return json.dumps({"response": text, "page": 1})
+        return text
+
+    async def _astream_raw(self, contents, model: str, system_instruction: str = None):
+        # Time to first token is the configured latency; the rest follows in chunks.
+        text = await self._agenerate_raw(contents, model, system_instruction)
+        words = text.split(" ")
+        for i in range(0, len(words), 8):
+            yield " ".join(words[i:i + 8]) + " "
+            await asyncio.sleep(0)
 
-class LLMService:
     def summarize(self, pdf_path: str) -> str:
         try:
             file_size = pathlib.Path(pdf_path).stat().st_size
-            return f"Dummy summary: The document is {file_size} bytes in size."
-        except Exception as e:
-            return f"Dummy summarization error: {str(e)}"
+            summary = f"Dummy summary: The document is {file_size} bytes in size."
+        except Exception:
+            # Not a file: page HTML or text passed directly.
+            summary = f"Dummy summary: The document is {len(pdf_path)} characters long."
+        if self.latency or self.output_chars:
+            summary = f"{summary} {self.generate([summary], operation='summarize')}"
+        return summary
+
+    def generate_metadata(self, pdf_path: str) -> dict:
+        return {
+            "title": pathlib.Path(pdf_path[:200]).stem or "Untitled",
+            "date": None,
+            "authors": [],
+            "tags": ["dummy"],
+        }
+
+    def analyze(self, document: str, fallback: bool = False) -> dict:
+        return validate_analysis({**self.generate_metadata(document), "summary": self.summarize(document)})
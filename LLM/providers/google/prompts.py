@@ -71,3 +71,58 @@ Return the result as a JSON array of objects, where each object follows this sch
 
 Ensure that the output is valid JSON.
 """
+
+# This prompt re-ranks a small candidate set that the local retrieval index
+# has already selected for a user query. Candidates carry only the compact
+# fields needed for ranking, and the model returns ids and scores only; the
+# backend fills in the full document records from its own store.
+
+RERANK_DOCUMENTS_PROMPT = """
+You are given a set of candidate documents in JSON format:
+{documents_json}
+
+And a user query:
+"{query}"
+
+Using the above information, select and rank the top {top_n} documents that best match the query.
+Return the result as a JSON array of objects, where each object follows this schema:
+{{
+  "id": string,
+  "relevance": number
+}}
+
+Only use ids that appear in the candidate set. Ensure that the output is valid JSON.
+"""
+
+# Single-call document analysis: the summary of SUMMARIZATION_PROMPT and the
+# metadata of METADATA_PROMPT in one JSON object, so a document is only sent
+# to the model once.
+
+ANALYSIS_PROMPT = (
+  """
+  Task: Analyze the following document and return its summary and metadata as a single valid JSON object.
+
+Instructions:
+
+    Summary - Summarize the document according to these instructions, formatted as Markdown text:
+        1. List the top 5 topics discussed in the document.
+        2. Briefly describe the discussion for each topic.
+        3. Provide a more detailed description for each topic.
+    Title - The document’s title, if available.
+    Date - The date the document was created or published. If not explicitly mentioned, infer the most likely date from the content.
+    Authors - The names of the authors, creators, or organizations responsible for the document.
+    Tags - A list of relevant topics, themes, or keywords extracted from the document. Use concise, meaningful words.
+
+Output schema:
+
+{
+  "summary": string,
+  "title": string,
+  "date": string or null,
+  "authors": [string],
+  "tags": [string]
+}
+
+Ensure the output follows this JSON format and accurately reflects the content of the document. If any field other than summary is missing, infer the best possible answer or leave it as null.
+"""
+)
@@ -1,76 +1,143 @@
+import logging
 import os
+import threading
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables from .env
 from google import genai
 from google.genai import types
 import pathlib
 import json
-from LLM.providers.google.prompts import SUMMARIZATION_PROMPT, METADATA_PROMPT
+from common import metrics
+from LLM.interface import LLMService as BaseLLMService, validate_analysis
+from LLM.providers.google.prompts import SUMMARIZATION_PROMPT, METADATA_PROMPT, ANALYSIS_PROMPT
+
+logger = logging.getLogger(__name__)
+
+# One genai.Client per process, shared by every LLMService instance. Its
+# async API is only used from the LLM gateway's event loop.
+_client = None
+_client_lock = threading.Lock()
+
+def get_client(api_key: str):
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = genai.Client(api_key=api_key)
+        return _client
+
+def _parse_json(raw_text: str):
+    """Parse a JSON response, tolerating a ```json ... ``` wrapper."""
+    raw_text = raw_text.strip()
+    if raw_text.startswith("```json"):
+        raw_text = raw_text[len("```json"):].strip()
+    if raw_text.endswith("```"):
+        raw_text = raw_text[:-3].strip()
+    with metrics.stage("json_parse"):
+        return json.loads(raw_text)
+
+class LLMService(BaseLLMService):
+    provider_name = "google"
 
-class LLMService:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise Exception("GEMINI_API_KEY not set in environment variables")
-        self.client = genai.Client(api_key=self.api_key)
+        self.client = get_client(self.api_key)
         self.model = "gemini-1.5-flash"
 
+    @staticmethod
+    def _to_parts(contents):
+        parts = []
+        for item in contents:
+            if isinstance(item, (bytes, bytearray)):
+                parts.append(types.Part.from_bytes(data=bytes(item), mime_type='application/pdf'))
+            else:
+                parts.append(item)
+        return parts
+
+    @staticmethod
+    def _config(system_instruction: str = None, json_output: bool = False):
+        if not system_instruction and not json_output:
+            return None
+        return types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            response_mime_type="application/json" if json_output else None,
+        )
+
+    async def _agenerate_raw(self, contents, model: str, system_instruction: str = None,
+                             json_output: bool = False) -> str:
+        response = await self.client.aio.models.generate_content(
+            model=model,
+            config=self._config(system_instruction, json_output),
+            contents=self._to_parts(contents)
+        )
+        return response.text or ""
+
+    async def _astream_raw(self, contents, model: str, system_instruction: str = None):
+        stream = await self.client.aio.models.generate_content_stream(
+            model=model,
+            config=self._config(system_instruction),
+            contents=self._to_parts(contents)
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
     def _process_input(self, input_str: str, prompt: str):
         """Helper function to determine if input is a file or text."""
         if os.path.exists(input_str):
-            print(f"DEBUG: Reading PDF file: {input_str}")
-            pdf_bytes = pathlib.Path(input_str).read_bytes()
-            part = types.Part.from_bytes(
-                data=pdf_bytes,
-                mime_type='application/pdf'
-            )
-            contents = [part, prompt]
+            logger.debug(f"Reading PDF file: {input_str}")
+            contents = [pathlib.Path(input_str).read_bytes(), prompt]
         else:
-            print("DEBUG: Input is plain text.")
+            logger.debug("Input is plain text.")
             contents = [input_str, prompt]
-        
+
         return contents
-    
+
     def summarize(self, input_str: str) -> str:
         """Summarizes a PDF file or text input using SUMMARIZATION_PROMPT."""
-        print("DEBUG: Summarizing document...")
+        logger.debug("Summarizing document...")
         contents = self._process_input(input_str, SUMMARIZATION_PROMPT)
 
-        response = self.client.models.generate_content(
-            model=self.model,
-            config=types.GenerateContentConfig(system_instruction=SUMMARIZATION_PROMPT),
-            contents=contents
-        )
-        print("DEBUG: Gemini API summary response:", response.text)
-        return response.text
+        text = self.generate(contents, system_instruction=SUMMARIZATION_PROMPT, operation="summarize")
+        logger.debug("Gemini API summary response: %s", text)
+        return text
 
     def generate_metadata(self, input_str: str) -> dict:
         """Extracts metadata (title, authors, date, tags) from a PDF or text input."""
-        print("DEBUG: Extracting metadata...")
+        logger.debug("Extracting metadata...")
         contents = self._process_input(input_str, METADATA_PROMPT)
 
-        response = self.client.models.generate_content(
-            model=self.model,
-            config=types.GenerateContentConfig(system_instruction=METADATA_PROMPT),
-            contents=contents
-        )
-
-        if not response or not response.text.strip():
+        raw_text = self.generate(contents, system_instruction=METADATA_PROMPT, operation="generate_metadata").strip()
+        if not raw_text:
             raise Exception("Gemini API returned an empty response for metadata extraction.")
 
-        raw_text = response.text.strip()
-        print("DEBUG: Gemini API metadata raw response:", raw_text)
-
-        # Sanitize Gemini API response if wrapped in ```json ... ```
-        if raw_text.startswith("```json"):
-            raw_text = raw_text[len("```json"):].strip()
-        if raw_text.endswith("```"):
-            raw_text = raw_text[:-3].strip()
+        logger.debug("Gemini API metadata raw response: %s", raw_text)
 
         try:
-            metadata = json.loads(raw_text)  # Ensure it's valid JSON
+            metadata = _parse_json(raw_text)  # Ensure it's valid JSON
         except json.JSONDecodeError as e:
             raise Exception(f"Failed to parse metadata JSON: {e}. Raw response: {raw_text}")
 
         return metadata
 
+    def analyze(self, input_str: str, fallback: bool = False) -> dict:
+        """
+        Summary and metadata (title, authors, date, tags) from a single call
+        using ANALYSIS_PROMPT. If the response does not validate and
+        `fallback` is set, the separate summarize/generate_metadata calls
+        are made instead.
+        """
+        logger.debug("Analyzing document...")
+        contents = self._process_input(input_str, ANALYSIS_PROMPT)
+
+        try:
+            raw_text = self.generate(contents, system_instruction=ANALYSIS_PROMPT, json_output=True,
+                                     operation="analyze").strip()
+            logger.debug("Gemini API analysis raw response: %s", raw_text)
+            return validate_analysis(_parse_json(raw_text))
+        except Exception as e:
+            if not fallback:
+                raise Exception(f"Document analysis failed: {e}")
+            logger.debug(f"Single-call analysis failed ({e}); falling back to separate calls.")
+            return super().analyze(input_str)
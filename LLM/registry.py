@@ -0,0 +1,73 @@
+import importlib
+import threading
+
+# Prompt templates each operation of a provider's LLMService uses; they are
+# part of the LLM cache key.
+OPERATION_PROMPTS = {
+    "summarize": "SUMMARIZATION_PROMPT",
+    "generate_metadata": "METADATA_PROMPT",
+    "analyze": "ANALYSIS_PROMPT",
+}
+
+class ProviderRegistry:
+    """
+    Resolves `LLM.providers.<name>` modules once per process.
+
+    Nothing is imported until a provider is first asked for, so importing a
+    service does not pull in a provider's SDK (e.g. google-genai); the
+    provider's LLMService is created on first use and then shared. Each
+    provider package has a `service` module exporting `LLMService` and may
+    have a `prompts` module.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._services = {}
+        self._prompts = {}
+
+    def service(self, name: str):
+        name = name.lower()
+        service = self._services.get(name)
+        if service is not None:
+            return service
+        with self._lock:
+            if name not in self._services:
+                try:
+                    module = importlib.import_module(f"LLM.providers.{name}.service")
+                    self._services[name] = module.LLMService()
+                except Exception as e:
+                    raise Exception(f"Error loading LLM provider '{name}': {e}")
+            return self._services[name]
+
+    def prompts(self, name: str):
+        """The provider's prompts module, or None if it has none."""
+        name = name.lower()
+        if name in self._prompts:
+            return self._prompts[name]
+        with self._lock:
+            if name not in self._prompts:
+                try:
+                    self._prompts[name] = importlib.import_module(f"LLM.providers.{name}.prompts")
+                except ImportError:
+                    self._prompts[name] = None
+            return self._prompts[name]
+
+    def prompt(self, name: str, prompt_name: str) -> str:
+        module = self.prompts(name)
+        if module is None or not hasattr(module, prompt_name):
+            raise Exception(f"Error loading prompt for provider '{name}': no {prompt_name}")
+        return getattr(module, prompt_name)
+
+    def operation_prompts(self, name: str) -> dict:
+        """operation -> prompt template, for CachedLLMService."""
+        module = self.prompts(name)
+        if module is None:
+            return {}
+        # An operation without a template is keyed by its name, so the
+        # cache keys of different operations never collide.
+        return {operation: getattr(module, attr, operation) for operation, attr in OPERATION_PROMPTS.items()}
+
+_registry = ProviderRegistry()
+
+def get_registry() -> ProviderRegistry:
+    return _registry
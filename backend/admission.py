@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from common import metrics
+
+ADMISSION_REJECTED = metrics.counter(
+    "ethqna_admission_rejected_total", "Requests rejected with 429 because an endpoint was full.", ("endpoint",)
+)
+SINGLE_FLIGHT_SHARED = metrics.counter(
+    "ethqna_single_flight_shared_total", "Calls answered by joining an identical call already in flight.", ("kind",)
+)
+
+class Overloaded(Exception):
+    """Raised when an endpoint's running and waiting slots are all taken."""
+
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(f"Too many {endpoint} requests in progress; try again shortly.")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+class AdmissionLimit:
+    """
+    Concurrency limit for one endpoint with a bounded wait queue.
+
+    Up to `max_concurrent` requests run at once and up to `max_waiting` more
+    wait for a slot, each for at most `wait_seconds`. A request arriving
+    when the queue is full, or whose wait runs out, gets Overloaded at once
+    instead of piling up. Used from the event loop of one process.
+    """
+
+    def __init__(self, endpoint: str, max_concurrent: int = 4, max_waiting: int = 16,
+                 wait_seconds: float = 30, retry_after: int = 5):
+        self.endpoint = endpoint
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_waiting = max(0, int(max_waiting))
+        self.wait_seconds = wait_seconds
+        self.retry_after = retry_after
+        self.running = 0
+        self.waiting = 0
+        self._semaphore = None
+
+    def _reject(self):
+        ADMISSION_REJECTED.inc(endpoint=self.endpoint)
+        return Overloaded(self.endpoint, self.retry_after)
+
+    async def acquire(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            raise self._reject()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.wait_seconds)
+        except asyncio.TimeoutError:
+            raise self._reject()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {"running": self.running, "waiting": self.waiting,
+                "max_concurrent": self.max_concurrent, "max_waiting": self.max_waiting}
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one. The first caller for a
+    key runs the function; callers arriving while it runs wait for it and
+    get the same result or exception. Nothing is cached once the call
+    finishes. `do` is for threads, `ado` for coroutines on one event loop.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            SINGLE_FLIGHT_SHARED.inc(kind=self.kind)
+            return future.result()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key, function, *args, **kwargs):
+        task = self._async_calls.get(key)
+        if task is not None:
+            SINGLE_FLIGHT_SHARED.inc(kind=self.kind)
+            # A caller that goes away must not cancel the shared call.
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(function(*args, **kwargs))
+        self._async_calls[key] = task
+
+        def finished(task):
+            self._async_calls.pop(key, None)
+            if not task.cancelled():
+                task.exception()  # retrieved here in case every caller went away
+
+        task.add_done_callback(finished)
+        return await asyncio.shield(task)
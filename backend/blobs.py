@@ -0,0 +1,125 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})\.pdf$")
+
+class PdfBlobStore:
+    """
+    Content-addressed PDF files: a PDF is stored once as <content_hash>.pdf
+    however many documents point at it. Files are reference counted through
+    the document store (documents whose pdf_file names them) and removed
+    when the last reference goes away.
+
+    Between `put` and the write of the document that uses it, a blob is held
+    by a pending reference (a row in pending.db, keyed by the holder's
+    document id) so that a release from any process cannot delete it under
+    a queued upload or a running analysis. `put` and `release` are
+    serialized by that database's write lock; pending references older than
+    `pending_ttl_seconds` (left by a process that died) are ignored.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pending (
+        pdf_file TEXT NOT NULL,
+        holder TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (pdf_file, holder)
+    );
+    """
+
+    def __init__(self, pdf_dir: str, store, pending_ttl_seconds: float = 7 * 24 * 3600):
+        self.pdf_dir = pdf_dir
+        self.store = store
+        self.pending_ttl_seconds = pending_ttl_seconds
+        self._path = os.path.join(pdf_dir, "pending.db")
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def filename_for(content_hash: str) -> str:
+        return f"{content_hash}.pdf"
+
+    @staticmethod
+    def hash_of(pdf_file: str):
+        """The content hash a blob filename encodes, or None for legacy (uuid) names."""
+        match = BLOB_NAME_RE.match(pdf_file or "")
+        return match.group(1) if match else None
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """Content hash of the PDF at `path`, the name its blob is stored under."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, pdf_file: str) -> str:
+        return os.path.join(self.pdf_dir, pdf_file)
+
+    def exists(self, content_hash: str) -> bool:
+        return os.path.exists(self.path(self.filename_for(content_hash)))
+
+    def put(self, tmp_path: str, content_hash: str, holder: str) -> str:
+        """
+        Move a freshly written PDF into place, or drop it if already stored,
+        and hold it for `holder` until `settle` is called.
+        """
+        pdf_file = self.filename_for(content_hash)
+        target = self.path(pdf_file)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO pending (pdf_file, holder, created) VALUES (?, ?, ?)",
+                         (pdf_file, holder, time.time()))
+            if os.path.exists(target):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, target)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return pdf_file
+
+    def settle(self, pdf_file: str, holder: str):
+        """Drop `holder`'s pending reference, once its document is stored (or abandoned)."""
+        self._conn().execute("DELETE FROM pending WHERE pdf_file = ? AND holder = ?", (pdf_file, holder))
+
+    def pending(self, pdf_file: str) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM pending WHERE pdf_file = ? AND created > ?",
+            (pdf_file, time.time() - self.pending_ttl_seconds),
+        ).fetchone()[0]
+
+    def release(self, pdf_file: str) -> bool:
+        """Delete `pdf_file` if no stored document or pending upload references it any more."""
+        if not pdf_file:
+            return False
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = False
+            if self.pending(pdf_file) == 0 and self.store.count_pdf_refs(pdf_file) == 0:
+                path = self.path(pdf_file)
+                if os.path.exists(path):
+                    os.remove(path)
+                    deleted = True
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted
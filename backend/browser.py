@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from common import metrics
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/101.0.4951.67 Safari/537.36"
+)
+
+class PageCaptureError(Exception):
+    """Raised when a page cannot be navigated to or rendered."""
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class BrowserPool:
+    """
+    A fixed set of warm headless Chromium workers.
+
+    Playwright's sync API is bound to the thread that started it, so every
+    worker is a dedicated thread that owns one browser and takes capture
+    tasks from a shared queue. Each capture gets a fresh browser context
+    (isolated cookies/storage) and the browser itself is recycled after
+    `max_pages` captures to keep memory growth in check.
+    """
+
+    def __init__(self, size: int = 2, max_pages: int = 50, timeout_ms: int = 60000):
+        self.size = max(1, int(size))
+        self.max_pages = max(1, int(max_pages))
+        self.timeout_ms = timeout_ms
+        self._tasks = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start workers up to `size`, replacing any that failed to start."""
+        with self._lock:
+            for i in range(len(self._workers), self.size):
+                worker = threading.Thread(target=self._worker, name=f"browser-pool-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._tasks.put(None)
+        for worker in workers:
+            worker.join(timeout=10)
+
+    def capture(self, url: str, pdf_path: str):
+        """
+        Navigate to `url` once, write the rendered PDF to `pdf_path` and
+        return (sha256 of the page HTML, page HTML).
+        """
+        self.start()
+        future = Future()
+        # Allow for the captures queued ahead of this one, each of which
+        # may take a browser launch, a navigation and a PDF render.
+        rounds = self._tasks.qsize() // self.size + 1
+        timeout = rounds * (2 * self.timeout_ms / 1000 + 30)
+        self._tasks.put((str(url), pdf_path, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if not future.cancel():
+                # A worker is still rendering it; drop the PDF once it is done.
+                future.add_done_callback(lambda _: _discard(pdf_path))
+            _discard(pdf_path)
+            raise PageCaptureError(f"Timed out after {timeout:.0f}s waiting to capture {url}")
+
+    def queue_depth(self) -> int:
+        """Captures waiting for a free browser."""
+        return self._tasks.qsize()
+
+    def _render(self, browser, url: str, pdf_path: str):
+        context = browser.new_context(user_agent=USER_AGENT)
+        try:
+            page = context.new_page()
+            with metrics.stage("browser_navigate"):
+                page.goto(url, wait_until="networkidle", timeout=self.timeout_ms)
+                content = page.content()
+            with metrics.stage("pdf_render"):
+                page.pdf(path=pdf_path)
+        finally:
+            context.close()
+        hash_val = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return hash_val, content
+
+    def _worker(self):
+        try:
+            self._serve()
+        except Exception as e:
+            # Typically Playwright is missing or Chromium cannot start. Leave
+            # the pool so the next capture starts a replacement. If no
+            # worker is left, fail the captures waiting in the queue rather
+            # than leaving them blocked.
+            logger.exception(f"Browser worker stopped: {e}")
+            metrics.ERRORS.inc(component="browser")
+            with self._lock:
+                if threading.current_thread() in self._workers:
+                    self._workers.remove(threading.current_thread())
+                alive = any(worker.is_alive() for worker in self._workers)
+            if not alive:
+                self._fail_queued(PageCaptureError(f"Browser worker failed: {e}"))
+
+    def _fail_queued(self, error: Exception):
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                return
+            if task is None:
+                # A close() sentinel meant for another worker.
+                self._tasks.put(None)
+                return
+            future = task[2]
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _serve(self):
+        from playwright.sync_api import sync_playwright
+
+        with sync_playwright() as p:
+            browser = None
+            pages_served = 0
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    break
+                url, pdf_path, future = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if browser is None or pages_served >= self.max_pages or not browser.is_connected():
+                        if browser is not None:
+                            try:
+                                browser.close()
+                            except Exception:
+                                pass
+                        browser = p.chromium.launch(headless=True)
+                        pages_served = 0
+                    result = self._render(browser, url, pdf_path)
+                    pages_served += 1
+                    future.set_result(result)
+                except Exception as e:
+                    future.set_exception(e)
+            if browser is not None:
+                browser.close()
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import re
+from html.parser import HTMLParser
+
+from .browser import USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+# Elements whose text is never part of a page's meaningful content.
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "head",
+             "nav", "header", "footer", "aside", "form", "button"}
+# If a page marks up its main content, only that is compared.
+MAIN_TAGS = {"main", "article"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+             "meta", "param", "source", "track", "wbr"}
+
+# Fragments that change between loads without the content changing: clock
+# times, "5 minutes ago", long hex/base64-ish tokens (nonces, cache busters).
+VOLATILE_RE = re.compile(
+    r"\b\d{1,2}:\d{2}(:\d{2})?\s*(am|pm)?\b"
+    r"|\b\d+\s+(second|minute|hour|day)s?\s+ago\b"
+    r"|\b(?=[a-z0-9_-]*\d)[a-z0-9_-]{24,}\b"
+    r"|\b[0-9a-f]{16,}\b"
+)
+
+class _MainTextParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.main_depth = 0
+        self.all_text = []
+        self.main_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in MAIN_TAGS:
+            self.main_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in MAIN_TAGS and self.main_depth:
+            self.main_depth -= 1
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        self.all_text.append(data)
+        if self.main_depth:
+            self.main_text.append(data)
+
+def main_text(html: str) -> str:
+    """Visible text of the page's main content (or whole body), markup and chrome removed."""
+    parser = _MainTextParser()
+    parser.feed(html)
+    parser.close()
+    return " ".join(parser.main_text or parser.all_text)
+
+def normalize_text(text: str) -> str:
+    text = VOLATILE_RE.sub(" ", text.lower())
+    return " ".join(text.split())
+
+def text_hash(html: str) -> str:
+    """Hash of the normalized main-content text; stable across loads of an unchanged page."""
+    return hashlib.sha256(normalize_text(main_text(html)).encode("utf-8")).hexdigest()
+
+def comparable_text_hash(html: str, min_chars: int = 200):
+    """
+    text_hash of a fetched page, or None if its main text is shorter than
+    `min_chars`: a page rendered by JavaScript (or wrapped in <noscript>)
+    has next to no text before rendering, and its hash would stay the same
+    whatever the rendered content.
+    """
+    text = normalize_text(main_text(html))
+    if len(text) < min_chars:
+        return None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def check_url(url: str, previous: dict = None, timeout: float = 10, min_text_chars: int = 200):
+    """
+    Cheap check of whether `url` changed since `previous` (the validators a
+    previous check returned) without rendering it: a conditional GET using
+    its ETag/Last-Modified, then a comparison of the main-content text hash.
+
+    Returns (status, validators) where status is "not_modified" (304),
+    "unchanged" (same text hash), "changed", or "unknown" if the page could
+    not be fetched (validators is None) or has too little text without
+    rendering to compare (see comparable_text_hash).
+    """
+    import requests
+
+    previous = previous or {}
+    headers = {"User-Agent": USER_AGENT}
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        logger.debug(f"Change check for {url} failed: {e}")
+        return "unknown", None
+    if response.status_code == 304:
+        return "not_modified", previous
+    if response.status_code != 200:
+        return "unknown", None
+
+    if "html" in response.headers.get("Content-Type", ""):
+        new_hash = comparable_text_hash(response.text, min_text_chars)
+    else:
+        new_hash = hashlib.sha256(response.content).hexdigest()
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "text_hash": new_hash,
+    }
+    if new_hash is None:
+        return "unknown", validators
+    status = "unchanged" if previous.get("text_hash") == new_hash else "changed"
+    return status, validators
@@ -0,0 +1,274 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+from .map import DELTA_FILE, MAP_FILE, consume_delta, map_links, source_dir_name
+
+logger = logging.getLogger(__name__)
+
+# Statuses returned by process_page that mean the URL needs no further work.
+DONE_STATUSES = {"added", "updated", "unchanged"}
+
+CHECKPOINT_FILE = "crawl_checkpoint.json"
+
+def load_map_urls(map_file: str):
+    """Read the URLs from a saved firecrawl map."""
+    with open(map_file, "r") as f:
+        return map_links(json.load(f))
+
+def load_delta(source_dir: str):
+    """The changes to a source's map not yet crawled (map_delta.json), or None."""
+    path = os.path.join(source_dir, DELTA_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def find_maps(storage_path: str, sources=None):
+    """
+    Return (source_dir, map_file) pairs for the saved maps under
+    <storage_path>/maps, optionally limited to the given sources.
+    """
+    maps_dir = os.path.join(storage_path, "maps")
+    if not os.path.isdir(maps_dir):
+        return []
+    wanted = None
+    if sources:
+        wanted = {source_dir_name(s) for s in sources}
+    found = []
+    for name in sorted(os.listdir(maps_dir)):
+        if wanted is not None and name not in wanted:
+            continue
+        map_file = os.path.join(maps_dir, name, MAP_FILE)
+        if os.path.exists(map_file):
+            found.append((os.path.join(maps_dir, name), map_file))
+    return found
+
+class Checkpoint:
+    """
+    Per-source record of the URLs crawled in one run, so an interrupted
+    crawl resumes where it stopped. `run_id` names what the run covers
+    (which map, full or delta). URLs that finished with one of
+    DONE_STATUSES are only skipped when resuming an unfinished run with the
+    same id; a completed run, a different map, or `fresh` starts an empty
+    record, so every later crawl checks each URL again. Failed URLs are
+    always tried again.
+    """
+
+    def __init__(self, path: str, run_id: str = None, fresh: bool = False, flush_every: int = 25):
+        self.path = path
+        self.run_id = run_id
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._complete = False
+        self.entries = {}
+        if os.path.exists(path) and not fresh:
+            with open(path, "r") as f:
+                saved = json.load(f)
+            # Files from earlier versions are a bare {url: entry} dict with
+            # no run id, so they are never resumed.
+            if saved.get("run_id") == run_id and not saved.get("complete", True):
+                self.entries = saved.get("entries", {})
+
+    def is_done(self, url: str) -> bool:
+        entry = self.entries.get(url)
+        return bool(entry) and entry.get("status") in DONE_STATUSES
+
+    def record(self, url: str, status: str, detail: str, attempts: int):
+        with self._lock:
+            self.entries[url] = {"status": status, "detail": detail, "attempts": attempts}
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._flush_locked()
+
+    def forget(self, url: str):
+        """Drop `url`'s entry, e.g. because it was removed from the map."""
+        with self._lock:
+            if self.entries.pop(url, None) is not None:
+                self._pending += 1
+
+    def complete(self):
+        """Mark the run finished; the next crawl starts from an empty record."""
+        with self._lock:
+            self._complete = True
+            self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"run_id": self.run_id, "complete": self._complete, "entries": self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
+
+class HostLimiter:
+    """Caps concurrent requests per host and spaces out request starts."""
+
+    def __init__(self, per_host: int = 2, delay_seconds: float = 0.0):
+        self.per_host = max(1, int(per_host))
+        self.delay_seconds = delay_seconds
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+
+    def acquire(self, host: str):
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        semaphore.acquire()
+        if self.delay_seconds > 0:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.delay_seconds
+            if start > now:
+                time.sleep(start - now)
+
+    def release(self, host: str):
+        self._semaphores[host].release()
+
+def crawl_urls(process, urls, checkpoint: Checkpoint, concurrency: int = 8, per_host: int = 2,
+               retries: int = 2, backoff_seconds: float = 2.0, host_delay_seconds: float = 0.0,
+               progress=None):
+    """
+    Run `process(url) -> (status, detail)` over `urls` with bounded
+    concurrency and per-host limits, retrying failures with exponential
+    backoff. URLs are consumed lazily, so very large maps are streamed
+    rather than queued up front. Returns crawl statistics.
+    """
+    limiter = HostLimiter(per_host, host_delay_seconds)
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "error": 0, "skipped": 0}
+    counts_lock = threading.Lock()
+    started = time.monotonic()
+
+    def run(url):
+        host = urlparse(url).netloc
+        attempts = 0
+        while True:
+            attempts += 1
+            limiter.acquire(host)
+            try:
+                status, detail = process(url)
+            except Exception as e:
+                status, detail = "error", str(e)
+            finally:
+                limiter.release(host)
+            if status in DONE_STATUSES or attempts > retries:
+                break
+            time.sleep(backoff_seconds * (2 ** (attempts - 1)))
+        checkpoint.record(url, status, detail, attempts)
+        with counts_lock:
+            counts[status if status in counts else "error"] += 1
+
+    def report():
+        if progress is not None:
+            processed = sum(v for k, v in counts.items() if k != "skipped")
+            progress(f"crawl: {processed} processed, {counts['skipped']} skipped, {counts['error']} errors")
+
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency)), thread_name_prefix="crawl") as executor:
+        for url in urls:
+            if checkpoint.is_done(url):
+                with counts_lock:
+                    counts["skipped"] += 1
+                continue
+            # Keep a small window of submitted work instead of the whole map.
+            while len(in_flight) >= concurrency * 2:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                report()
+            in_flight.add(executor.submit(run, url))
+        for future in in_flight:
+            future.result()
+    checkpoint.flush()
+    report()
+
+    elapsed = time.monotonic() - started
+    processed = sum(v for k, v in counts.items() if k != "skipped")
+    return {
+        **counts,
+        "processed": processed,
+        "elapsed_seconds": round(elapsed, 2),
+        "pages_per_second": round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+
+def map_version(map_file: str) -> str:
+    stat = os.stat(map_file)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def crawl_maps(process, storage_path: str, sources=None, progress=None, delta=False, remove=None,
+               fresh=False, **options):
+    """
+    Crawl the URLs in the saved maps, one checkpoint per source. With
+    `delta`, only the URLs added to the map since the last crawl are
+    crawled (the whole map if there is no delta yet), and `remove(url)`, if
+    given, is called for every URL dropped from it. Either way the URLs
+    handled are taken out of the delta. An interrupted crawl of the same
+    map resumes from its checkpoint unless `fresh` is set.
+    """
+    results = {}
+    for source_dir, map_file in find_maps(storage_path, sources):
+        source = os.path.basename(source_dir)
+        map_delta = load_delta(source_dir) if delta else None
+        if map_delta is None:
+            logger.debug(f"Crawling map {map_file}")
+            run_id = f"full:{map_version(map_file)}"
+            urls = load_map_urls(map_file)
+        else:
+            logger.debug(f"Crawling delta of {map_file}: {len(map_delta['added'])} added, "
+                  f"{len(map_delta['removed'])} removed")
+            run_id = f"delta:{map_delta.get('mapped_at')}"
+            urls = map_delta["added"]
+        checkpoint = Checkpoint(os.path.join(source_dir, CHECKPOINT_FILE), run_id=run_id, fresh=fresh)
+        results[source] = crawl_urls(process, urls, checkpoint, progress=progress, **options)
+        handled = set()
+        if map_delta is not None:
+            removed = 0
+            for url in map_delta["removed"]:
+                checkpoint.forget(url)
+                if remove is not None and remove(url):
+                    removed += 1
+            # Without a remove handler removed URLs are only reported, and
+            # stay pending until one is configured.
+            if remove is not None:
+                handled = set(map_delta["removed"])
+            results[source]["removed"] = removed
+        consume_delta(source_dir, {url for url in urls if checkpoint.is_done(url)}, handled)
+        checkpoint.complete()
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest every URL from the saved firecrawl maps.")
+    parser.add_argument("--source", action="append", help="Only crawl this source (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--per-host", type=int, default=None)
+    parser.add_argument("--retries", type=int, default=None)
+    parser.add_argument("--delta", action="store_true", help="Only crawl URLs added to the map since the last crawl")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint of an interrupted crawl")
+    args = parser.parse_args()
+
+    from backend import main
+
+    overrides = {
+        "concurrency": args.concurrency,
+        "per_host": args.per_host,
+        "retries": args.retries,
+    }
+    options = main.get_crawl_options({k: v for k, v in overrides.items() if v is not None})
+    try:
+        stats = crawl_maps(main.process_page, main.PDF_DIR, sources=args.source, progress=print,
+                           delta=args.delta, remove=main.get_removed_url_handler(), fresh=args.fresh,
+                           **options)
+    finally:
+        main.browser_pool.close()
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,109 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+# Matches lowercase alphanumeric tokens; everything else is a separator.
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Title, tags and authors are short and precise, so a hit there counts for
+# more than a hit somewhere in a multi-paragraph summary.
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "authors": 2.0,
+    "description": 1.0,
+}
+
+def tokenize(text: str):
+    return TOKEN_RE.findall(text.lower())
+
+def _field_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value if v)
+    return str(value)
+
+class DocumentIndex:
+    """
+    In-memory BM25 index over document metadata (title, description, tags,
+    authors). Documents are added and removed one at a time so the index can
+    follow the document store without being rebuilt.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)  # term -> {doc_id: weighted term frequency}
+        self._doc_terms = {}                # doc_id -> set of terms, used for removal
+        self._doc_lengths = {}              # doc_id -> weighted document length
+        self._total_length = 0.0
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_lengths
+
+    def _remove_locked(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0.0)
+
+    def add(self, doc: dict):
+        """Index (or re-index) a single document."""
+        doc_id = doc["id"]
+        frequencies = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(_field_text(doc.get(field))):
+                frequencies[term] += weight
+        length = sum(frequencies.values())
+        with self._lock:
+            self._remove_locked(doc_id)
+            for term, tf in frequencies.items():
+                self._postings[term][doc_id] = tf
+            self._doc_terms[doc_id] = set(frequencies)
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def rebuild(self, docs):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0.0
+        for doc in docs:
+            self.add(doc)
+
+    def search(self, query: str, top_k: int = 10):
+        """Return up to top_k (doc_id, score) pairs, best match first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if not terms or not n_docs:
+                return []
+            avg_length = (self._total_length / n_docs) or 1.0
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from common import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_SECONDS = metrics.histogram("ethqna_job_seconds", "Background job run time.", ("kind", "status"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+class JobQueue:
+    """
+    Background job runner with a bounded worker pool.
+
+    Jobs live in an SQLite table shared by every backend process, so any
+    worker can report on any job. A job is run by whichever process claims
+    it first: the claim is a single conditional UPDATE from queued to
+    running, so no job runs twice. Running jobs are kept alive by a
+    heartbeat; jobs left queued, or running without a heartbeat for
+    `lease_seconds` (their process died), are claimed again by the sweep
+    every `poll_seconds` and by `resume()` at startup.
+
+    Handlers are registered per job kind and are called as
+    `handler(params, progress)`, where `progress(stage)` records the stage
+    the job has reached; whatever the handler returns is stored as the result.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        params TEXT NOT NULL,
+        status TEXT NOT NULL,
+        stage TEXT,
+        result TEXT,
+        error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        owner TEXT,
+        heartbeat REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+    CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at);
+    CREATE TABLE IF NOT EXISTS jobs_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """
+
+    def __init__(self, path: str, max_workers: int = 2, max_history: int = 500,
+                 lease_seconds: float = 60, poll_seconds: float = 15, migrate_from: str = None):
+        self.path = path
+        self.max_history = max_history
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = set()  # job ids handed to this process's executor
+        self._running = set()  # job ids this process is running
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="jobs")
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        if migrate_from:
+            self._migrate_json(migrate_from)
+        self._sweeper = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _migrate_json(self, json_path: str):
+        """One-time import of the jobs.json written by earlier versions."""
+        if not os.path.exists(json_path):
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM jobs_meta WHERE key = 'json_migrated'").fetchone() is None:
+                with open(json_path, "r") as f:
+                    jobs = json.load(f)
+                for job in jobs.values():
+                    self._insert(conn, job)
+                conn.execute("INSERT INTO jobs_meta (key, value) VALUES ('json_migrated', ?)", (json_path,))
+                logger.debug(f"Migrated {len(jobs)} jobs from {json_path} to {self.path}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _insert(conn, job: dict):
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs (id, kind, params, status, stage, result, error, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["kind"], json.dumps(job["params"]), job["status"], job.get("stage"),
+             json.dumps(job.get("result")), job.get("error"), job["created_at"], job["updated_at"]),
+        )
+
+    @staticmethod
+    def _row_to_job(row):
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "params": json.loads(row[2]),
+            "status": row[3],
+            "stage": row[4],
+            "result": json.loads(row[5]) if row[5] is not None else None,
+            "error": row[6],
+            "created_at": row[7],
+            "updated_at": row[8],
+        }
+
+    _COLUMNS = "id, kind, params, status, stage, result, error, created_at, updated_at"
+
+    def _prune(self, conn):
+        conn.execute(
+            "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN (?, ?)"
+            " ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (DONE, ERROR, self.max_history),
+        )
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = _now()
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._conn()
+        conn.execute(f"UPDATE jobs SET {assignments}, heartbeat = ? WHERE id = ?",
+                     (*fields.values(), time.time(), job_id))
+        if fields.get("status") in (DONE, ERROR):
+            self._prune(conn)
+
+    def _claim(self, job_id: str) -> bool:
+        """Atomically move a claimable job to running under this process."""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, stage = 'started', owner = ?, heartbeat = ?, updated_at = ?"
+            " WHERE id = ? AND (status = ? OR (status = ? AND (heartbeat IS NULL OR heartbeat < ?)))",
+            (RUNNING, self.owner, time.time(), _now(), job_id, QUEUED, RUNNING, time.time() - self.lease_seconds),
+        )
+        return cursor.rowcount == 1
+
+    def register(self, kind: str, handler):
+        self._handlers[kind] = handler
+
+    def _dispatch(self, job_id: str):
+        with self._lock:
+            if job_id in self._pending:
+                return False
+            self._pending.add(job_id)
+        self._executor.submit(self._run, job_id)
+        return True
+
+    def submit(self, kind: str, params: dict) -> dict:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        now = _now()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "params": params,
+            "status": QUEUED,
+            "stage": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._insert(self._conn(), job)
+        self._dispatch(job["id"])
+        return dict(job)
+
+    def _claimable(self):
+        rows = self._conn().execute(
+            "SELECT id FROM jobs WHERE status = ? OR (status = ? AND (heartbeat IS NULL OR heartbeat < ?))"
+            " ORDER BY created_at",
+            (QUEUED, RUNNING, time.time() - self.lease_seconds),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def resume(self):
+        """
+        Pick up jobs that are queued or were running in a process that has
+        stopped, and start the heartbeat/sweep thread. Returns how many jobs
+        were handed to this process.
+        """
+        resumed = sum(1 for job_id in self._claimable() if self._dispatch(job_id))
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep, name="jobs-sweep", daemon=True)
+            self._sweeper.start()
+        return resumed
+
+    def _sweep(self):
+        interval = min(self.poll_seconds, self.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            try:
+                with self._lock:
+                    running = list(self._running)
+                if running:
+                    placeholders = ",".join("?" for _ in running)
+                    self._conn().execute(
+                        f"UPDATE jobs SET heartbeat = ? WHERE owner = ? AND id IN ({placeholders})",
+                        (time.time(), self.owner, *running),
+                    )
+                for job_id in self._claimable():
+                    self._dispatch(job_id)
+            except Exception as e:
+                logger.error(f"Job sweep failed: {e}")
+
+    def depth(self) -> int:
+        """Jobs waiting to be claimed."""
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def get(self, job_id: str):
+        row = self._conn().execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list(self, status: str = None, limit: int = 100):
+        if status is None:
+            rows = self._conn().execute(
+                f"SELECT {self._COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = self._conn().execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                (status, limit),
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def shutdown(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id: str):
+        try:
+            if not self._claim(job_id):
+                return  # finished, or claimed by another process
+            with self._lock:
+                self._running.add(job_id)
+            try:
+                self._execute(job_id)
+            finally:
+                with self._lock:
+                    self._running.discard(job_id)
+        finally:
+            with self._lock:
+                self._pending.discard(job_id)
+
+    def _execute(self, job_id: str):
+        job = self.get(job_id)
+
+        def progress(stage: str):
+            self._update(job_id, stage=stage)
+
+        started = time.monotonic()
+        try:
+            result = self._handlers[job["kind"]](job["params"], progress)
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({job['kind']}) failed: {e}")
+            metrics.ERRORS.inc(component="jobs")
+            JOB_SECONDS.observe(time.monotonic() - started, kind=job["kind"], status=ERROR)
+            self._update(job_id, status=ERROR, error=str(e))
+            return
+        JOB_SECONDS.observe(time.monotonic() - started, kind=job["kind"], status=DONE)
+        self._update(job_id, status=DONE, stage="done", result=result)
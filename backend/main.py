@@ -1,16 +1,38 @@
+import logging
 import os
 import uuid
+import threading
+import time
 import json
 import hashlib
-import yaml
-import importlib
-from fastapi import FastAPI, HTTPException, File, UploadFile, Depends
+from fastapi import FastAPI, HTTPException, File, UploadFile, Depends, Request, Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
 import secrets
+from contextlib import asynccontextmanager, contextmanager
 from pydantic import BaseModel
-from typing import List
-from playwright.sync_api import sync_playwright
+from typing import Any, Dict, List, Optional
 from . import map as fc_map  # Import map.py from the same package
+from . import crawl as fc_crawl
+from . import changes as fc_changes
+from .index import DocumentIndex
+from .browser import BrowserPool, PageCaptureError
+from .jobs import JobQueue
+from .store import JsonDocumentStore, open_store
+from .blobs import PdfBlobStore
+from .pages import PageStore
+from .admission import AdmissionLimit, Overloaded, SingleFlight
+from .query_cache import QueryCache, query_terms
+from .ranking import candidate_summary, estimate_tokens, sharded_rank
+from LLM.cache import CachedLLMService, make_key, open_cache, sha256_text
+from LLM.gateway import configure_gateway, get_gateway
+from LLM.registry import get_registry
+from common import metrics
+from common.config import get_config
+from common.logs import configure_logging
+
+logger = logging.getLogger(__name__)
 
 # --- Basic Auth Setup ---
 security = HTTPBasic()
@@ -40,53 +62,95 @@ app = FastAPI(
 PDF_DIR = os.path.join("data", "pdf_sources")
 if not os.path.exists(PDF_DIR):
     os.makedirs(PDF_DIR)
-DOCUMENTS_FILE = os.path.join(PDF_DIR, "documents.json")
+JOBS_FILE = os.path.join(PDF_DIR, "jobs.json")
+JOBS_DB = os.path.join(PDF_DIR, "jobs.db")
+
+def load_config(config_file='config/config.yaml'):
+    """The parsed config, re-read only when the file has changed."""
+    return get_config(config_file).get()
 
-def load_json(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return json.load(f)
-    return {}
+# Log records are handed to a background thread instead of being written
+# on the request path.
+configure_logging((load_config().get("logging", {}) or {}).get("level", "INFO"))
 
-def save_json(file_path, data):
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
+# Document metadata store (SQLite by default). An existing documents.json
+# is imported into it the first time it is opened.
+store = open_store(load_config(), PDF_DIR)
 
-# Load stored documents from documents.json.
-documents = load_json(DOCUMENTS_FILE)
+# Local retrieval index over the stored documents. Routes in this process
+# update it directly; writes made by other workers are picked up from the
+# store's change log by sync_index() before each search.
+doc_index = DocumentIndex()
+index_seq = store.last_change()
+doc_index.rebuild(store.all())
+index_sync_lock = threading.Lock()
 
-def load_config(config_file='config/config.yaml'):
-    with open(config_file, 'r') as f:
-        return yaml.safe_load(f)
+def sync_index():
+    """Apply documents written by any process since the index was last synced."""
+    global index_seq
+    if store.last_change() == index_seq:
+        return
+    with index_sync_lock:
+        latest, changed = store.changes_since(index_seq)
+        if changed is None:
+            doc_index.rebuild(store.all())
+        else:
+            for doc_id in changed:
+                doc = store.get(doc_id)
+                if doc is None:
+                    doc_index.remove(doc_id)
+                else:
+                    doc_index.add(doc)
+        index_seq = latest
+
+def get_query_cache():
+    """Ranked query results by normalized query, or None when disabled in config."""
+    cache_config = load_config().get("query_cache", {}) or {}
+    if not cache_config.get("enabled", True):
+        return None
+    return QueryCache(
+        max_items=cache_config.get("max_items", 1000),
+        similarity=cache_config.get("similarity", 0.8),
+    )
 
-def get_llm_provider():
+query_cache = get_query_cache()
+
+# PDFs are stored once per content hash and shared between documents.
+pdf_blobs = PdfBlobStore(PDF_DIR, store)
+
+# Per-page PDF text used by the frontend /chat to pick relevant pages.
+page_store = PageStore(os.path.join(PDF_DIR, "pages.db"))
+
+# LLM providers and their prompts, each imported once on first use.
+providers = get_registry()
+llm_services = {}
+
+def get_llm_service():
     """
-    Dynamically load and return an instance of LLMService based on the config.
-    Each provider module should export a concrete class named 'LLMService'
-    that implements summarize(text: str) -> str.
+    The configured provider's LLMService, wrapped in the LLM cache. Nothing
+    is imported or instantiated until the first call, so importing this
+    module stays fast; a provider change in the config applies on the next
+    call.
     """
-    config = load_config()
-    provider_name = config.get("long_context_llm", "dummy").lower()
-    module_path = f"LLM.providers.{provider_name}.service"
-    try:
-        provider_module = importlib.import_module(module_path)
-        provider_class = getattr(provider_module, "LLMService")
-        return provider_class()
-    except Exception as e:
-        raise Exception(f"Error loading LLM provider '{provider_name}': {e}")
+    provider_name = load_config().get("long_context_llm", "dummy").lower()
+    service = llm_services.get(provider_name)
+    if service is None:
+        service = providers.service(provider_name)
+        if llm_cache is not None:
+            service = CachedLLMService(service, llm_cache, provider_name, providers.operation_prompts(provider_name))
+        llm_services[provider_name] = service
+    return service
 
-# Instantiate our LLM provider using configuration.
-llm_service = get_llm_provider()
+# Every LLM request in this process goes through one gateway, which
+# enforces the concurrency, rate and retry limits from `llm_limits`.
+configure_gateway(load_config().get("llm_limits"))
 
-def get_query_prompt():
-    config = load_config()
-    provider_name = config.get("long_context_llm", "dummy").lower()
-    module_path = f"LLM.providers.{provider_name}.prompts"
-    try:
-        prompt_module = importlib.import_module(module_path)
-        return getattr(prompt_module, "QUERY_DOCUMENTS_PROMPT")
-    except Exception as e:
-        raise Exception(f"Error loading prompt for provider '{provider_name}': {e}")
+# Shared LLM response cache (in-memory LRU plus data/llm_cache.db).
+llm_cache = open_cache(load_config())
+
+def get_query_prompt(prompt_name="QUERY_DOCUMENTS_PROMPT"):
+    provider_name = load_config().get("long_context_llm", "dummy").lower()
+    return providers.prompt(provider_name, prompt_name)
 
 # Updated Pydantic models for documents and query requests.
 class Document(BaseModel):
@@ -107,233 +171,746 @@ class QuerySelectAdvancedResponseDocument(BaseModel):
     url: str
     pdf_file: str
     content_hash: str
+    title: Optional[str] = None     # null when the LLM found none.
     description: str
     relevance: float
 
 class QuerySelectAdvancedResponse(BaseModel):
     documents: List[QuerySelectAdvancedResponseDocument]
 
-def convert_url_to_pdf(url: str, pdf_path: str):
+class CrawlRequest(BaseModel):
+    sources: Optional[List[str]] = None     # Defaults to every saved map.
+    concurrency: Optional[int] = None
+    per_host: Optional[int] = None
+    retries: Optional[int] = None
+    delta: bool = False                     # Only URLs added since the last crawl.
+    fresh: bool = False                     # Don't resume an interrupted crawl.
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: str         # queued, running, done or error
+    stage: Optional[str] = None
+    params: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+
+def get_browser_pool():
+    config = load_config()
+    browser_config = config.get("browser", {}) or {}
+    return BrowserPool(
+        size=browser_config.get("pool_size", 2),
+        max_pages=browser_config.get("max_pages_per_browser", 50),
+        timeout_ms=browser_config.get("navigation_timeout_ms", 60000),
+    )
+
+# Warm Chromium workers shared by every ingestion path. Browsers are
+# launched lazily on the first capture.
+browser_pool = get_browser_pool()
+
+@app.on_event("shutdown")
+def shutdown_browser_pool():
+    browser_pool.close()
+
+def capture_page(url: str):
+    """
+    Render `url` once and return (content_hash, content, tmp_pdf_path).
+    The PDF is written to a temporary file that the caller either moves
+    into place or discards if the page turns out to be unchanged.
+    """
+    tmp_pdf_path = os.path.join(PDF_DIR, f".{uuid.uuid4()}.pdf.tmp")
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                           "AppleWebKit/537.36 (KHTML, like Gecko) "
-                           "Chrome/101.0.4951.67 Safari/537.36"
-            )
-            page = context.new_page()
-            page.goto(str(url), wait_until="networkidle", timeout=60000)
-            page.pdf(path=pdf_path)
-            browser.close()
+        new_hash, content = browser_pool.capture(str(url), tmp_pdf_path)
     except Exception as e:
-        raise Exception(f"Error converting URL to PDF: {str(e)}")
+        if os.path.exists(tmp_pdf_path):
+            os.remove(tmp_pdf_path)
+        raise PageCaptureError(f"Error capturing page: {str(e)}")
+    return new_hash, content, tmp_pdf_path
+
+# Fields that depend only on a document's content. A document whose content
+# hash is already known copies these from the existing record instead of
+# paying for another PDF render and LLM calls.
+CONTENT_FIELDS = ("pdf_file", "content_hash", "description", "title", "date", "authors", "tags")
+
+def put_document(doc: dict):
+    """Store a new or updated document and re-index it."""
+    store.put(doc)
+    doc_index.add(doc)
 
-def get_page_content_and_hash(url: str) -> (str, str):
+def remove_document(doc_id: str):
+    doc = store.delete(doc_id)
+    doc_index.remove(doc_id)
+    return doc
+
+def index_pages(pdf_file: str):
+    """Extract a PDF's page text once; chat falls back to the whole PDF if this fails."""
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                           "AppleWebKit/537.36 (KHTML, like Gecko) "
-                           "Chrome/101.0.4951.67 Safari/537.36"
-            )
-            page = context.new_page()
-            page.goto(str(url), wait_until="networkidle", timeout=60000)
-            content = page.content()
-            browser.close()
-            hash_val = hashlib.sha256(content.encode("utf-8")).hexdigest()
-            return hash_val, content
+        with metrics.stage("page_extract"):
+            page_store.ensure(pdf_file, os.path.join(PDF_DIR, pdf_file))
     except Exception as e:
-        raise Exception(f"Error computing content and hash: {str(e)}")
+        metrics.ERRORS.inc(component="page_extract")
+        logger.error(f"Failed to extract page text from {pdf_file}. {e}")
 
-def process_page(url: str):
-    existing_doc = None
-    for d in documents.values():
-        if d["url"] == str(url):
-            existing_doc = d
-            break
+def release_pdf(pdf_file: str):
+    """Drop a PDF and its page text once no document references it."""
+    if pdf_blobs.release(pdf_file):
+        page_store.remove(pdf_file)
+
+@contextmanager
+def holding_pdf(pdf_file: str, holder: str):
+    """
+    Keep the blob `holder` got from pdf_blobs.put for the with-block, which
+    should store the document using it; afterwards it is released unless a
+    stored document now references it.
+    """
+    try:
+        yield
+    finally:
+        pdf_blobs.settle(pdf_file, holder)
+        release_pdf(pdf_file)
+
+def find_by_content(content_hash: str, exclude_id: str = None):
+    for d in store.find_by_hash(content_hash):
+        if d["id"] != exclude_id and d.get("pdf_file"):
+            return d
+    return None
+
+def _no_progress(stage: str):
+    pass
+
+def analyze_document(document: str, progress=_no_progress) -> dict:
+    """Summary and metadata (title, date, authors, tags) from one LLM call."""
+    config = load_config()
+    fallback = (config.get("analysis", {}) or {}).get("fallback", True)
+    progress("analyze")
+    try:
+        return get_llm_service().analyze(document, fallback=fallback)
+    except Exception as e:
+        metrics.ERRORS.inc(component="analyze")
+        logger.error(f"Failed to analyze document. {e}")
+        raise Exception(f"Document analysis failed: {e}")
+
+# Identical work already in flight in this process is joined, not repeated.
+url_flights = SingleFlight("url")
+upload_flights = SingleFlight("upload")
+query_flights = SingleFlight("query")
+
+def ingest_url(url: str, progress=_no_progress):
+    """
+    Capture `url` and add or update its document.
+    Returns (status, doc) where status is "added", "updated" or "unchanged".
+    Raises PageCaptureError if the page could not be rendered. Concurrent
+    calls for the same URL share one capture and its result.
+    """
+    return url_flights.do(str(url), _ingest_url, url, progress)
+
+def _ingest_url(url: str, progress=_no_progress):
+    existing_doc = store.find_by_url(url)
+    check_config = load_config().get("change_check", {}) or {}
+
+    # Before rendering, ask the server whether the page changed at all
+    # (ETag/Last-Modified) and compare its main text with the last fetch.
+    validators = None
+    if check_config.get("enabled", True):
+        progress("check")
+        previous = existing_doc.get("change_check") if existing_doc else None
+        with metrics.stage("change_check"):
+            check_status, validators = fc_changes.check_url(
+                str(url), previous, timeout=check_config.get("timeout_seconds", 10),
+                min_text_chars=check_config.get("min_text_chars", 200),
+            )
+        if existing_doc and check_status in ("not_modified", "unchanged"):
+            if validators != previous:
+                existing_doc = {**existing_doc, "change_check": validators}
+                put_document(existing_doc)
+            return "unchanged", existing_doc
+
+    progress("capture")
+    new_hash, content, tmp_pdf_path = capture_page(url)
+    rendered_hash = fc_changes.text_hash(content)
+    if existing_doc and (existing_doc["content_hash"] == new_hash
+                         or existing_doc.get("rendered_text_hash") == rendered_hash):
+        # The DOM differs only in volatile parts (tokens, timestamps, ads).
+        os.remove(tmp_pdf_path)
+        if validators is not None and validators != existing_doc.get("change_check"):
+            existing_doc = {**existing_doc, "change_check": validators}
+            put_document(existing_doc)
+        return "unchanged", existing_doc
 
-    new_hash, content = get_page_content_and_hash(url)
     if existing_doc:
-        if existing_doc["content_hash"] == new_hash:
-            return "unchanged", existing_doc["id"]
-        else:
-            pdf_path = os.path.join(PDF_DIR, existing_doc["pdf_file"])
-            try:
-                convert_url_to_pdf(url, pdf_path)
-            except Exception as e:
-                return "error", str(e)
-            existing_doc["content_hash"] = new_hash
-            existing_doc["description"] = llm_service.summarize(content)
-            return "updated", existing_doc["id"]
+        doc = {**existing_doc}
+        status = "updated"
+    else:
+        doc = {"id": str(uuid.uuid4()), "url": str(url)}
+        status = "added"
+
+    known = find_by_content(new_hash, exclude_id=doc["id"])
+    if known:
+        # Same content already ingested under another URL: reuse its PDF,
+        # summary and metadata.
+        os.remove(tmp_pdf_path)
+        doc.update({field: known[field] for field in CONTENT_FIELDS if field in known})
+        _store_page(doc, rendered_hash, validators, progress)
     else:
-        doc_id = str(uuid.uuid4())
-        pdf_filename = f"{doc_id}.pdf"
-        pdf_path = os.path.join(PDF_DIR, pdf_filename)
+        # The blob is named by the PDF's bytes, like uploads; content_hash
+        # stays the page's hash, used to detect changes and shared content.
+        doc["pdf_file"] = pdf_blobs.put(tmp_pdf_path, pdf_blobs.hash_file(tmp_pdf_path), holder=doc["id"])
+        doc["content_hash"] = new_hash
+        with holding_pdf(doc["pdf_file"], doc["id"]):
+            progress("extract")
+            index_pages(doc["pdf_file"])
+            analysis = analyze_document(content, progress)
+            doc.update({
+                "description": analysis["summary"],
+                "title": analysis["title"],
+                "date": analysis["date"],
+                "authors": analysis["authors"],
+                "tags": analysis["tags"],
+            })
+            _store_page(doc, rendered_hash, validators, progress)
+
+    if existing_doc and existing_doc["pdf_file"] != doc["pdf_file"]:
+        release_pdf(existing_doc["pdf_file"])
+    return status, doc
+
+def _store_page(doc: dict, rendered_hash: str, validators, progress):
+    doc["rendered_text_hash"] = rendered_hash
+    if validators is not None:
+        doc["change_check"] = validators
+    progress("store")
+    put_document(doc)
+
+def ingest_pdf(doc_id: str, pdf_filename: str, content_hash: str, progress=_no_progress):
+    """
+    Summarize an already saved PDF, extract its metadata and store the document.
+    Returns (status, doc); status is "unchanged" if the PDF was already known.
+    Concurrent calls for the same content share one analysis and document.
+    The blob is held for `doc_id` (see save_upload) until then, and deleted
+    if no document ends up using it.
+    """
+    with holding_pdf(pdf_filename, doc_id):
+        return upload_flights.do(content_hash, _ingest_pdf, doc_id, pdf_filename, content_hash, progress)
+
+def _ingest_pdf(doc_id: str, pdf_filename: str, content_hash: str, progress=_no_progress):
+    # If the known document still uses a legacy <uuid>.pdf, the blob just
+    # saved for this upload is released by ingest_pdf.
+    known = find_by_content(content_hash)
+    if known:
+        return "unchanged", known
+
+    pdf_path = os.path.join(PDF_DIR, pdf_filename)
+    analysis = analyze_document(pdf_path, progress)
+
+    new_doc = {
+        "id": doc_id,
+        "url": f"local://{pdf_filename}",
+        "pdf_file": pdf_filename,
+        "content_hash": content_hash,
+        "description": analysis["summary"],
+        "title": analysis["title"],
+        "date": analysis["date"],
+        "authors": analysis["authors"],
+        "tags": analysis["tags"]
+    }
+
+    progress("extract")
+    index_pages(pdf_filename)
+    progress("store")
+    put_document(new_doc)
+    return "added", new_doc
+
+def process_page(url: str):
+    try:
+        status, doc = ingest_url(url)
+    except Exception as e:
+        metrics.ERRORS.inc(component="ingest")
+        return "error", str(e)
+    return status, doc["id"]
+
+def get_upload_limits():
+    upload_config = load_config().get("uploads", {}) or {}
+    return {
+        "max_bytes": int(float(upload_config.get("max_size_mb", 100)) * 1024 * 1024),
+        "chunk_bytes": int(upload_config.get("chunk_kb", 1024)) * 1024,
+    }
+
+upload_limits = get_upload_limits()
+
+async def save_upload(file: UploadFile):
+    """
+    Validate and save an uploaded PDF under its content hash. The file is
+    copied to a temp file in chunks, hashed in the same pass, and renamed
+    into place once complete, held for doc_id until ingest_pdf has stored
+    its document. Size and concurrency are already enforced by UploadGuard.
+    Returns (doc_id, pdf_filename, content_hash).
+    """
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="Invalid file type. Only PDFs are accepted.")
+
+    doc_id = str(uuid.uuid4())
+    tmp_path = os.path.join(PDF_DIR, f".{doc_id}.pdf.tmp")
+    digest = hashlib.sha256()
+
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = await file.read(upload_limits["chunk_bytes"])
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise HTTPException(status_code=500, detail=f"Failed to save PDF: {e}")
+
+    new_hash = digest.hexdigest()
+    pdf_filename = pdf_blobs.put(tmp_path, new_hash, holder=doc_id)
+    return doc_id, pdf_filename, new_hash
+
+# --- Admission control ---
+# Each expensive endpoint runs at most max_concurrent requests per process,
+# with up to max_waiting more queued; the rest are turned away with 429.
+ADMISSION_DEFAULTS = {
+    "documents": {"max_concurrent": 4, "max_waiting": 16, "wait_seconds": 60},
+    "upload": {"max_concurrent": 4, "max_waiting": 16, "wait_seconds": 60},
+    "query": {"max_concurrent": 16, "max_waiting": 64, "wait_seconds": 10},
+}
+
+def get_admission_limits():
+    admission_config = load_config().get("admission", {}) or {}
+    limits = {}
+    for endpoint, defaults in ADMISSION_DEFAULTS.items():
+        settings = {**defaults, **(admission_config.get(endpoint, {}) or {})}
+        limits[endpoint] = AdmissionLimit(
+            endpoint,
+            max_concurrent=settings["max_concurrent"],
+            max_waiting=settings["max_waiting"],
+            wait_seconds=settings["wait_seconds"],
+            retry_after=admission_config.get("retry_after_seconds", 5),
+        )
+    return limits
+
+admission_limits = get_admission_limits()
+
+@asynccontextmanager
+async def admitted(endpoint: str):
+    """Hold one of `endpoint`'s slots for the with-block, or fail fast with 429."""
+    limit = admission_limits[endpoint]
+    try:
+        await limit.acquire()
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    try:
+        yield
+    finally:
+        limit.release()
+
+UPLOAD_PATHS = ("/upload", "/jobs/upload")
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadGuard:
+    """
+    ASGI middleware applying the upload limits before the multipart body is
+    parsed, which Starlette does (spooling it to disk) before the route
+    runs. A declared Content-Length over `uploads.max_size_mb` gets 413 and
+    a full `admission.upload` limit gets 429, both without reading the
+    body; a body that grows past the limit anyway is cut off with 413. The
+    admission slot is held until the response has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in UPLOAD_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = upload_limits["max_bytes"]
+        too_large = JSONResponse({"detail": f"Upload exceeds {max_bytes} bytes."}, status_code=413)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > max_bytes:
+            await too_large(scope, receive, send)
+            return
+        limit = admission_limits["upload"]
         try:
-            convert_url_to_pdf(url, pdf_path)
-        except Exception as e:
-            return "error", str(e)
-        new_doc = {
-            "id": doc_id,
-            "url": str(url),
-            "pdf_file": pdf_filename,
-            "content_hash": new_hash,
-            "description": llm_service.summarize(content),
-        }
-        documents[doc_id] = new_doc
-        return "added", doc_id
+            await limit.acquire()
+        except Overloaded as e:
+            response = JSONResponse({"detail": str(e)}, status_code=429, headers={"Retry-After": str(e.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+        cut_off = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, cut_off
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    cut_off = True
+                    raise UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # FastAPI may turn the interrupted body into its own error
+            # response; the client gets the 413 instead.
+            if cut_off:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            pass
+        finally:
+            limit.release()
+        if cut_off and not started:
+            await too_large(scope, receive, send)
+
+app.add_middleware(UploadGuard)
 
 @app.get("/documents", response_model=List[Document], summary="List all documents")
-def get_documents():
-    return list(documents.values())
+def get_documents(tag: Optional[str] = None):
+    if tag:
+        return store.find_by_tag(tag)
+    return store.all()
 
 @app.post("/documents", response_model=Document, summary="Add or update a document")
-def add_document(doc: DocumentCreate):
-    existing_doc = None
-    for d in documents.values():
-        if d["url"] == str(doc.url):
-            existing_doc = d
-            break
-
-    new_hash, content = get_page_content_and_hash(doc.url)
-    if existing_doc:
-        if existing_doc["content_hash"] == new_hash:
-            return existing_doc
-        else:
-            pdf_path = os.path.join(PDF_DIR, existing_doc["pdf_file"])
-            try:
-                convert_url_to_pdf(doc.url, pdf_path)
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=str(e))
-            existing_doc["content_hash"] = new_hash
-            existing_doc["description"] = llm_service.summarize(content)
-            save_json(DOCUMENTS_FILE, documents)
-            return existing_doc
-    else:
-        doc_id = str(uuid.uuid4())
-        pdf_filename = f"{doc_id}.pdf"
-        pdf_path = os.path.join(PDF_DIR, pdf_filename)
+async def add_document(doc: DocumentCreate):
+    async with admitted("documents"):
         try:
-            convert_url_to_pdf(doc.url, pdf_path)
-        except Exception as e:
+            _, stored_doc = await run_in_threadpool(ingest_url, doc.url)
+        except PageCaptureError as e:
             raise HTTPException(status_code=400, detail=str(e))
-        new_doc = {
-            "id": doc_id,
-            "url": str(doc.url),
-            "pdf_file": pdf_filename,
-            "content_hash": new_hash,
-            "description": llm_service.summarize(content),
-        }
-        documents[doc_id] = new_doc
-        save_json(DOCUMENTS_FILE, documents)
-        return new_doc
+    return stored_doc
 
 @app.delete("/documents/{doc_id}", response_model=dict, summary="Delete a document")
 def delete_document(doc_id: str):
-    if doc_id not in documents:
+    doc = remove_document(doc_id)
+    if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
-    pdf_filename = documents[doc_id]["pdf_file"]
-    pdf_path = os.path.join(PDF_DIR, pdf_filename)
-    if os.path.exists(pdf_path):
-        os.remove(pdf_path)
-    del documents[doc_id]
-    save_json(DOCUMENTS_FILE, documents)
+    # The PDF may be shared with other documents of identical content.
+    release_pdf(doc["pdf_file"])
     return {"detail": "Document deleted successfully"}
 
 @app.post("/upload", response_model=Document, summary="Upload a PDF file and generate its metadata")
 async def upload_pdf(file: UploadFile = File(...)):
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="Invalid file type. Only PDFs are accepted.")
-    
-    doc_id = str(uuid.uuid4())
-    pdf_filename = f"{doc_id}.pdf"
-    pdf_path = os.path.join(PDF_DIR, pdf_filename)
-    
+    # UploadGuard holds an upload admission slot for this request.
+    doc_id, pdf_filename, new_hash = await save_upload(file)
     try:
-        file_bytes = await file.read()
-        with open(pdf_path, "wb") as f:
-            f.write(file_bytes)
+        _, stored_doc = await run_in_threadpool(ingest_pdf, doc_id, pdf_filename, new_hash)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save PDF: {e}")
-    
-    try:
-        new_hash = hashlib.sha256(file_bytes).hexdigest()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to compute file hash: {e}")
-    
-    # Generate summary using LLM
-    summary = llm_service.summarize(pdf_path)
+        raise HTTPException(status_code=500, detail=str(e))
+    return stored_doc
 
-    # Generate metadata using LLM
-    try:
-        metadata = llm_service.generate_metadata(pdf_path)
-    except Exception as e:
-        print(f"ERROR: Failed to extract metadata. {e}")
-        raise HTTPException(status_code=500, detail=f"Metadata extraction failed: {e}")
+# --- Background ingestion jobs ---
 
-    # Ensure expected metadata fields exist
-    new_doc = {
-        "id": doc_id,
-        "url": f"local://{pdf_filename}",
-        "pdf_file": pdf_filename,
-        "content_hash": new_hash,
-        "description": summary,
-        "title": metadata.get("title", "Unknown Title"),
-        "date": metadata.get("date", None),
-        "authors": metadata.get("authors", []),
-        "tags": metadata.get("tags", [])
+def _url_job(params: dict, progress):
+    status, doc = ingest_url(params["url"], progress)
+    return {"status": status, "document_id": doc["id"]}
+
+def _upload_job(params: dict, progress):
+    status, doc = ingest_pdf(params["doc_id"], params["pdf_file"], params["content_hash"], progress)
+    return {"status": status, "document_id": doc["id"]}
+
+def get_crawl_options(overrides=None):
+    config = load_config()
+    crawl_config = config.get("crawl", {}) or {}
+    options = {
+        "concurrency": crawl_config.get("concurrency", 8),
+        "per_host": crawl_config.get("per_host", 2),
+        "retries": crawl_config.get("retries", 2),
+        "backoff_seconds": crawl_config.get("backoff_seconds", 2.0),
+        "host_delay_seconds": crawl_config.get("host_delay_seconds", 1.0),
     }
+    options.update(overrides or {})
+    return options
 
-    documents[doc_id] = new_doc
-    save_json(DOCUMENTS_FILE, documents)
-    
-    return new_doc
+def remove_url(url: str) -> bool:
+    """Delete the document ingested from `url`, if any."""
+    doc = store.find_by_url(url)
+    if doc is None:
+        return False
+    remove_document(doc["id"])
+    release_pdf(doc["pdf_file"])
+    return True
 
-@app.post("/query/select_advanced", response_model=QuerySelectAdvancedResponse, summary="Select top 5 documents based on query")
-def query_select_advanced(request: QuerySelectAdvancedRequest):
-    query = request.query
-    documents_json = json.dumps(documents)
+def get_removed_url_handler():
+    """remove_url if `crawl.remove_missing` is set, else None (removed URLs are only reported)."""
+    crawl_config = load_config().get("crawl", {}) or {}
+    return remove_url if crawl_config.get("remove_missing", False) else None
+
+def _crawl_job(params: dict, progress):
+    overrides = {k: params[k] for k in ("concurrency", "per_host", "retries") if params.get(k) is not None}
+    return fc_crawl.crawl_maps(
+        process_page,
+        PDF_DIR,
+        sources=params.get("sources"),
+        progress=progress,
+        delta=params.get("delta", False),
+        remove=get_removed_url_handler(),
+        fresh=params.get("fresh", False),
+        **get_crawl_options(overrides),
+    )
+
+def get_job_queue():
+    config = load_config()
+    jobs_config = config.get("jobs", {}) or {}
+    queue = JobQueue(
+        JOBS_DB,
+        max_workers=jobs_config.get("max_workers", 2),
+        max_history=jobs_config.get("max_history", 500),
+        lease_seconds=jobs_config.get("lease_seconds", 60),
+        poll_seconds=jobs_config.get("poll_seconds", 15),
+        migrate_from=JOBS_FILE,
+    )
+    queue.register("url", _url_job)
+    queue.register("upload", _upload_job)
+    queue.register("crawl", _crawl_job)
+    return queue
+
+job_queue = get_job_queue()
+
+@app.on_event("startup")
+def resume_jobs():
+    resumed = job_queue.resume()
+    if resumed:
+        logger.debug(f"Resumed {resumed} unfinished ingestion job(s)")
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    job_queue.shutdown()
+
+@app.post("/jobs/documents", response_model=Job, status_code=202, summary="Queue a URL for background ingestion")
+def submit_document_job(doc: DocumentCreate):
+    return job_queue.submit("url", {"url": str(doc.url)})
+
+@app.post("/jobs/upload", response_model=Job, status_code=202, summary="Upload a PDF and queue its metadata generation")
+async def submit_upload_job(file: UploadFile = File(...)):
+    doc_id, pdf_filename, new_hash = await save_upload(file)
+    return job_queue.submit("upload", {"doc_id": doc_id, "pdf_file": pdf_filename, "content_hash": new_hash})
+
+@app.post("/crawl", response_model=Job, status_code=202, summary="Ingest every URL from the saved source maps")
+def submit_crawl_job(request: CrawlRequest):
+    if not fc_crawl.find_maps(PDF_DIR, request.sources):
+        raise HTTPException(status_code=400, detail="No saved maps found. Run /map-sources first.")
+    return job_queue.submit("crawl", request.dict())
+
+@app.get("/jobs", response_model=List[Job], summary="List ingestion jobs")
+def list_jobs(status: Optional[str] = None, limit: int = 100):
+    return job_queue.list(status=status, limit=limit)
+
+@app.get("/jobs/{job_id}", response_model=Job, summary="Get the status of an ingestion job")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+async def rerank_with_llm(query: str, candidates: list, top_n: int, max_chars: int) -> list:
+    """
+    Ask the configured LLM to re-rank the retrieved candidates. Returns a
+    list of (doc_id, relevance) pairs restricted to the candidate ids.
+    """
     try:
-        QUERY_DOCUMENTS_PROMPT = get_query_prompt()
+        RERANK_DOCUMENTS_PROMPT = get_query_prompt("RERANK_DOCUMENTS_PROMPT")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
-    prompt = QUERY_DOCUMENTS_PROMPT.format(documents_json=documents_json, query=query)
-    
-    try:
-        from google import genai
-    except ImportError:
-        raise HTTPException(status_code=500, detail="Google GenAI module not available.")
-    
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_api_key:
-        raise HTTPException(status_code=500, detail="GEMINI_API_KEY environment variable not set.")
-    
-    client = genai.Client(api_key=gemini_api_key)
-    response = client.models.generate_content(
-        model='gemini-2.0-flash',
-        contents=prompt,
-    )
-    raw_text = response.text
-    print("DEBUG: Raw Gemini response:", raw_text)
+
+    documents_json = json.dumps([candidate_summary(d, max_chars) for d in candidates])
+    prompt = RERANK_DOCUMENTS_PROMPT.format(documents_json=documents_json, query=query, top_n=top_n)
+    llm_service = get_llm_service()
+    model = (load_config().get("models", {}) or {}).get("query") or llm_service.model
+
+    key = make_key(llm_service.provider_name, model, RERANK_DOCUMENTS_PROMPT, sha256_text(prompt))
+    raw_text = llm_cache.get(key) if llm_cache is not None else None
+    if raw_text is None:
+        try:
+            raw_text = await llm_service.agenerate([prompt], model=model, json_output=True, operation="rerank")
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"LLM rerank failed: {e}")
+        if llm_cache is not None:
+            await run_in_threadpool(llm_cache.set, key, raw_text)
+    logger.debug("Raw rerank response: %s", raw_text)
     cleaned_text = raw_text.strip()
     if cleaned_text.startswith("```json"):
         cleaned_text = cleaned_text[len("```json"):].strip()
     if cleaned_text.endswith("```"):
         cleaned_text = cleaned_text[:-3].strip()
     try:
-        result = json.loads(cleaned_text)
+        with metrics.stage("json_parse"):
+            result = json.loads(cleaned_text)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error parsing Gemini response: {e}. Raw response: {raw_text}")
-    
-    if isinstance(result, list):
-        top_docs = result[:5]
-    else:
-        top_docs = result
+        raise HTTPException(status_code=500, detail=f"Error parsing rerank response: {e}. Raw response: {raw_text}")
+    if not isinstance(result, list):
+        # Providers without a ranking model (e.g. dummy) return an object.
+        return []
+
+    candidate_ids = {d["id"] for d in candidates}
+    ranked = []
+    for item in result:
+        if isinstance(item, dict) and item.get("id") in candidate_ids:
+            try:
+                relevance = float(item.get("relevance", 0))
+            except (TypeError, ValueError):
+                relevance = 0.0
+            ranked.append((item["id"], relevance))
+    return ranked[:top_n]
+
+def shard_budget(query: str, retrieval: dict) -> int:
+    """Tokens of document summaries that fit in one ranking prompt in sharded mode."""
+    try:
+        template = get_query_prompt("RERANK_DOCUMENTS_PROMPT")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    overhead = estimate_tokens(template) + estimate_tokens(query) + retrieval.get("output_reserve_tokens", 1000)
+    return max(1000, retrieval.get("context_budget_tokens", 200000) - overhead)
+
+@app.post("/query/select_advanced", response_model=QuerySelectAdvancedResponse, summary="Select top 5 documents based on query")
+async def query_select_advanced(request: QuerySelectAdvancedRequest):
+    query = request.query
+    config = load_config()
+    retrieval = config.get("retrieval", {}) or {}
+    scope = json.dumps([retrieval, config.get("long_context_llm"), config.get("models", {})], sort_keys=True)
+
+    async with admitted("query"):
+        # Popular questions are answered from the cache. The corpus version
+        # changes on every document write, which drops all cached rankings.
+        version = None
+        if query_cache is not None:
+            version = await run_in_threadpool(store.version)
+            cached = query_cache.get(query, version, scope)
+            if cached is not None:
+                return {"documents": cached}
+
+        # The same question asked again while it is being ranked waits for
+        # that ranking instead of starting another.
+        flight_key = (scope, version, " ".join(sorted(query_terms(query))))
+        top_docs, complete = await query_flights.ado(flight_key, rank_documents, query, retrieval)
+        # A BM25-only answer given because the LLM failed is not cached.
+        if query_cache is not None and complete:
+            query_cache.set(query, version, top_docs, scope)
     return {"documents": top_docs}
 
+async def rank_documents(query: str, retrieval: dict):
+    """
+    (top_n documents for `query`, each with its relevance; False if the LLM
+    ranking failed and the BM25 ranking was used instead).
+    """
+    top_n = retrieval.get("top_n", 5)
+    top_k = retrieval.get("top_k", 20)
+
+    # By default a small candidate set is retrieved from the local index and
+    # only these are sent to the LLM, however large the corpus grows. In
+    # "sharded" mode the LLM ranks the whole corpus instead, split into
+    # shards that each fit the context budget and are ranked concurrently.
+    sharded = retrieval.get("mode", "rerank") == "sharded"
+    await run_in_threadpool(sync_index)
+    hits = doc_index.search(query, top_k=top_k)
+    if sharded:
+        candidates = await run_in_threadpool(store.all)
+    else:
+        candidates = await run_in_threadpool(store.get_many, [doc_id for doc_id, _ in hits])
+    if not candidates:
+        return [], True
+
+    ranked = []
+    complete = True
+    max_chars = retrieval.get("rerank_description_chars", 500)
+    try:
+        if sharded:
+            async def rank_shard(query, shard, top_n):
+                return await rerank_with_llm(query, shard, top_n, max_chars)
+
+            ranked, complete = await sharded_rank(
+                query, candidates, rank_shard, top_n, shard_budget(query, retrieval), max_chars
+            )
+        elif retrieval.get("llm_rerank", True):
+            ranked = await rerank_with_llm(query, candidates, top_n, max_chars)
+    except Exception as e:
+        # No rerank prompt for the provider, or the LLM call failed.
+        detail = e.detail if isinstance(e, HTTPException) else e
+        logger.error(f"LLM ranking failed, using BM25 ranking: {detail}")
+        metrics.ERRORS.inc(component="rank")
+        complete = False
+    if not ranked and hits:
+        # Scale BM25 scores into 0..1 relative to the best hit.
+        best = hits[0][1] or 1.0
+        ranked = [(doc_id, round(score / best, 4)) for doc_id, score in hits[:top_n]]
+
+    by_id = {d["id"]: d for d in candidates}
+    top_docs = []
+    for doc_id, relevance in ranked:
+        doc = by_id.get(doc_id)
+        if doc is not None:
+            top_docs.append({**doc, "relevance": relevance})
+    return top_docs, complete
+
+@app.get("/query/cache", response_model=dict, summary="Query result cache hit rate and size")
+def query_cache_stats():
+    if query_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **query_cache.snapshot()}
+
+@app.get("/llm/cache", response_model=dict, summary="LLM response cache hit/miss counters")
+def llm_cache_stats():
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.snapshot()}
+
+# --- Metrics ---
+
+QUEUE_DEPTH = metrics.gauge("ethqna_queue_depth", "Work waiting in each queue.", ("queue",))
+QUEUE_DEPTH.set_function(lambda: {
+    ("browser",): browser_pool.queue_depth(),
+    ("jobs",): job_queue.depth(),
+    ("llm_gateway",): get_gateway().snapshot()["waiting"],
+    ("uploads",): admission_limits["upload"].running,
+    **{(f"admission_{name}",): limit.waiting for name, limit in admission_limits.items()},
+})
+LLM_IN_FLIGHT = metrics.gauge("ethqna_llm_in_flight", "LLM requests currently being made.")
+LLM_IN_FLIGHT.set_function(lambda: get_gateway().snapshot()["in_flight"])
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series bounded.
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, service="backend", method=request.method,
+            route=getattr(route, "path", "unmatched"), status=status,
+        )
+
+@app.get("/metrics", summary="Prometheus metrics for this worker process")
+def metrics_endpoint():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/admission", response_model=dict, summary="Running and queued requests per limited endpoint")
+def admission_stats():
+    return {name: limit.snapshot() for name, limit in admission_limits.items()}
+
+@app.get("/llm/gateway", response_model=dict, summary="LLM gateway request, retry and queue counters")
+def llm_gateway_stats():
+    return get_gateway().snapshot()
+
 @app.post("/map-sources", summary="Map sources from config using firecrawl")
 def map_sources_endpoint():
     config = load_config("config/config.yaml")
@@ -345,7 +922,8 @@ def map_sources_endpoint():
         map_results = fc_map.map_sources(
             sources=sources_to_map,
             storage_path=PDF_DIR,
-            api_key_env_var=api_key_env_var
+            api_key_env_var=api_key_env_var,
+            max_workers=(config.get("map", {}) or {}).get("concurrency", 4),
         )
         return map_results
     except Exception as e:
@@ -353,4 +931,16 @@ def map_sources_endpoint():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Workers share the SQLite document store and job table; each keeps its
+    # own search index in step through the store's change log.
+    server_config = load_config().get("server", {}) or {}
+    workers = int(os.environ.get("BACKEND_WORKERS", server_config.get("workers", 1)))
+    if workers > 1 and isinstance(store, JsonDocumentStore):
+        # Each worker would hold its own copy of documents.json in memory
+        # and overwrite the others' writes.
+        raise SystemExit(f"{workers} workers need document_store: sqlite; "
+                         "the json store only supports a single worker.")
+    if workers > 1:
+        uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,47 +1,154 @@
 # crawler/map.py
 
 import json
+import logging
 import os
-from firecrawl import FirecrawlApp
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from os import getenv
-import yaml
+
+from common.config import load_config as load_shared_config
+
+logger = logging.getLogger(__name__)
+
+MAP_FILE = "map_new.json"
+PREV_MAP_FILE = "map_prev.json"
+DELTA_FILE = "map_delta.json"
 
 def load_config(config_file='config/config.yaml'):
     """
     Load configuration from a YAML file.
     """
-    with open(config_file, 'r') as f:
-        config = yaml.safe_load(f)
-    return config
+    return load_shared_config(config_file)
+
+def source_dir_name(source: str) -> str:
+    """Directory under <storage_path>/maps that holds a source's maps."""
+    return source.replace('https://', '').replace('http://', '').replace('/', '_')
+
+def map_links(data):
+    """
+    The URLs in a firecrawl map. Depending on the SDK version a map is
+    either a plain list of links or a dict with a "links" list, whose
+    entries are strings or dicts carrying a "url".
+    """
+    if hasattr(data, "links") and not isinstance(data, (dict, list)):
+        data = {"links": data.links}
+    links = data.get("links", []) if isinstance(data, dict) else data
+    urls = []
+    for link in links or []:
+        url = link.get("url") if isinstance(link, dict) else getattr(link, "url", link)
+        if isinstance(url, str) and url.startswith(("http://", "https://")):
+            urls.append(url)
+    return urls
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+def _load_links(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return map_links(json.load(f))
+
+def _load_delta(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def map_source(app, source, storage_path):
+    """
+    Map one source and save it. The previous map is kept as map_prev.json.
+
+    map_delta.json holds the URLs added and removed since the last crawl
+    rather than since the last map: the changes of this run are merged into
+    whatever earlier runs left there, and a crawl takes out what it handled
+    (see consume_delta). On the first run every URL counts as added.
+    """
+    logger.info(f"Mapping source: {source}")
+    map_result_dict = app.map_url(source)
+    if not isinstance(map_result_dict, (dict, list)):
+        map_result_dict = {"links": map_links(map_result_dict)}
+
+    source_dir = os.path.join(storage_path, 'maps', source_dir_name(source))
+    os.makedirs(source_dir, exist_ok=True)
+    map_file = os.path.join(source_dir, MAP_FILE)
+    prev_file = os.path.join(source_dir, PREV_MAP_FILE)
 
-def map_sources(sources, storage_path, api_key_env_var):
+    previous = _load_links(map_file)
+    current = map_links(map_result_dict)
+    if previous and not current:
+        # Almost certainly a failed map; keep the old one rather than
+        # reporting the whole site as removed.
+        raise ValueError(f"Map of {source} returned no links")
+    if previous is not None:
+        os.replace(map_file, prev_file)
+    _write_json(map_file, map_result_dict)
+
+    previous_set = set(previous or [])
+    current_set = set(current)
+    added = current_set - previous_set
+    removed = previous_set - current_set
+    delta_file = os.path.join(source_dir, DELTA_FILE)
+    pending = _load_delta(delta_file) or {}
+    delta = {
+        "source": source,
+        "mapped_at": datetime.now(timezone.utc).isoformat(),
+        "first_run": previous is None,
+        "total": len(current_set),
+        "added": sorted((set(pending.get("added", [])) | added) - removed),
+        "removed": sorted((set(pending.get("removed", [])) | removed) - added),
+    }
+    _write_json(delta_file, delta)
+    logger.info(f"Map saved to {map_file} ({len(delta['added'])} added, {len(delta['removed'])} removed)")
+    return map_result_dict, delta
+
+def consume_delta(source_dir, crawled, removed):
     """
-    Map the provided sources and save the maps.
+    Take the URLs a crawl ingested (`crawled`) and dropped (`removed`) out
+    of a source's map_delta.json, so the next delta crawl only sees what is
+    still pending. URLs added by a mapping run in the meantime are kept.
     """
-    # Load environment variables
-    load_dotenv()
+    delta_file = os.path.join(source_dir, DELTA_FILE)
+    delta = _load_delta(delta_file)
+    if delta is None:
+        return
+    delta["added"] = [url for url in delta.get("added", []) if url not in crawled]
+    delta["removed"] = [url for url in delta.get("removed", []) if url not in removed]
+    _write_json(delta_file, delta)
 
-    api_key = getenv(api_key_env_var)
-    if not api_key:
-        raise EnvironmentError(f"{api_key_env_var} not found in environment variables.")
+def map_sources(sources, storage_path, api_key_env_var, app=None, max_workers=4):
+    """
+    Map the provided sources concurrently and save the maps and deltas.
+
+    `app` is anything with a firecrawl-style `map_url(source)`; by default a
+    FirecrawlApp is created from the API key. Returns {source: {"links",
+    "added", "removed"}}, or {"error": ...} for a source that failed.
+    """
+    if app is None:
+        from dotenv import load_dotenv
+        from firecrawl import FirecrawlApp
 
-    app = FirecrawlApp(api_key=api_key)
+        # Load environment variables
+        load_dotenv()
 
-    map_results = {}
-    for source in sources:
-        print(f"Mapping source: {source}")
-        map_result_dict = app.map_url(source)
-        map_results[source] = map_result_dict
+        api_key = getenv(api_key_env_var)
+        if not api_key:
+            raise EnvironmentError(f"{api_key_env_var} not found in environment variables.")
 
-        # Create source-specific directory
-        source_dir = os.path.join(storage_path, 'maps', source.replace('https://', '').replace('http://', '').replace('/', '_'))
-        os.makedirs(source_dir, exist_ok=True)
+        app = FirecrawlApp(api_key=api_key)
 
-        # Write the map to a JSON file
-        map_file = os.path.join(source_dir, 'map_new.json')
-        with open(map_file, 'w') as f:
-            json.dump(map_result_dict, f, indent=4)
-        print(f"Map saved to {map_file}")
+    def run(source):
+        try:
+            _, delta = map_source(app, source, storage_path)
+        except Exception as e:
+            logger.error(f"Mapping {source} failed: {e}")
+            return {"error": str(e)}
+        return {"links": delta["total"], "added": len(delta["added"]), "removed": len(delta["removed"])}
 
-    return map_results
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="map") as executor:
+        results = list(executor.map(run, sources))
+    return dict(zip(sources, results))
@@ -0,0 +1,130 @@
+import re
+import sqlite3
+import threading
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def extract_pages(pdf_path: str):
+    """Return the text of every page of a PDF, in page order."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    pages = []
+    for page in reader.pages:
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        pages.append(" ".join(text.split()))
+    return pages
+
+def match_expression(query: str):
+    """Turn free text into an FTS5 query that matches any of its terms."""
+    terms = sorted(set(TOKEN_RE.findall(query.lower())))
+    return " OR ".join(f'"{t}"' for t in terms)
+
+class PageStore:
+    """
+    Per-page PDF text, extracted once and kept in an SQLite FTS5 index so a
+    question can be answered from its best-matching pages instead of the
+    whole document. Pages are keyed by pdf_file, which is content addressed,
+    so identical PDFs share one set of pages. pdf_file is part of the
+    full-text index so a search only walks the postings of one PDF; it is
+    given zero weight in the ranking.
+    """
+
+    SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS pdf_pages USING fts5(
+        pdf_file,
+        page UNINDEXED,
+        text
+    );
+    CREATE TABLE IF NOT EXISTS pdf_extracted (
+        pdf_file TEXT PRIMARY KEY,
+        page_count INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _scope(pdf_file: str) -> str:
+        return 'pdf_file : "{}"'.format(pdf_file.replace('"', '""'))
+
+    def _delete_pages(self, conn, pdf_file: str):
+        conn.execute(
+            "DELETE FROM pdf_pages WHERE rowid IN"
+            " (SELECT rowid FROM pdf_pages WHERE pdf_pages MATCH ? AND pdf_file = ?)",
+            (self._scope(pdf_file), pdf_file),
+        )
+
+    def has(self, pdf_file: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM pdf_extracted WHERE pdf_file = ?", (pdf_file,)).fetchone()
+        return row is not None
+
+    def add(self, pdf_file: str, pages):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete_pages(conn, pdf_file)
+            conn.executemany(
+                "INSERT INTO pdf_pages (pdf_file, page, text) VALUES (?, ?, ?)",
+                [(pdf_file, number, text) for number, text in enumerate(pages, start=1)],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO pdf_extracted (pdf_file, page_count) VALUES (?, ?)",
+                (pdf_file, len(pages)),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def ensure(self, pdf_file: str, pdf_path: str) -> bool:
+        """Extract and index a PDF's pages unless that was already done."""
+        if self.has(pdf_file):
+            return False
+        self.add(pdf_file, extract_pages(pdf_path))
+        return True
+
+    def remove(self, pdf_file: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        self._delete_pages(conn, pdf_file)
+        conn.execute("DELETE FROM pdf_extracted WHERE pdf_file = ?", (pdf_file,))
+        conn.execute("COMMIT")
+
+    def search(self, pdf_file: str, query: str, top_k: int = 4):
+        """
+        Return up to top_k (page, text) pairs from `pdf_file` that best match
+        `query`, best first. Falls back to the opening pages when nothing
+        matches, so the model always gets some context.
+        """
+        conn = self._conn()
+        expression = match_expression(query)
+        rows = []
+        if expression:
+            rows = conn.execute(
+                "SELECT page, text FROM pdf_pages WHERE pdf_pages MATCH ? AND pdf_file = ?"
+                " ORDER BY bm25(pdf_pages, 0.0, 0.0, 1.0) LIMIT ?",
+                (f"{self._scope(pdf_file)} AND ({expression})", pdf_file, top_k),
+            ).fetchall()
+        if not rows:
+            rows = conn.execute(
+                "SELECT page, text FROM pdf_pages WHERE pdf_pages MATCH ? AND pdf_file = ?"
+                " ORDER BY CAST(page AS INTEGER) LIMIT ?",
+                (self._scope(pdf_file), pdf_file, top_k),
+            ).fetchall()
+        return [(int(page), text) for page, text in rows]
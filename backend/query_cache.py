@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict, defaultdict
+
+from common import metrics
+from .index import tokenize
+
+QUERY_CACHE_LOOKUPS = metrics.counter(
+    "ethqna_query_cache_lookups_total", "Ranked query result cache lookups by result.", ("result",)
+)
+
+# Words that do not change what a question is about, so "what is
+# danksharding" and "danksharding?" share one entry.
+STOPWORDS = frozenset("""
+a about an and are as at be by can could do does explain for from how i in into is it
+me of on or please tell the this to was what whats when where which who why with you
+""".split())
+
+def query_terms(query: str) -> frozenset:
+    terms = [t for t in tokenize(query) if t not in STOPWORDS]
+    # A query made only of stopwords is still cached on its own words.
+    return frozenset(terms or tokenize(query))
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class QueryCache:
+    """
+    In-process LRU of ranked /query/select_advanced results, keyed by the
+    normalized query (lowercased, punctuation and stopwords dropped, terms
+    sorted). A lookup that misses on the exact key falls back to the cached
+    query with the most similar term set, if its Jaccard similarity is at
+    least `similarity` (set it to 1 to disable near-duplicate matching).
+
+    Every entry belongs to a corpus version (the document store's version,
+    which changes on every add, update or delete, from any process) and the
+    whole cache is dropped when a lookup sees a new version, so a stale
+    ranking is never returned.
+    """
+
+    def __init__(self, max_items: int = 1000, similarity: float = 0.8):
+        self.max_items = max_items
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = OrderedDict()         # normalized query -> (terms, result)
+        self._by_term = defaultdict(set)      # term -> normalized queries containing it
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _count(self, stat: str):
+        self.stats[stat] += 1
+        if stat in ("hits", "near_hits", "misses"):
+            QUERY_CACHE_LOOKUPS.inc(result=stat)
+
+    def _check_version(self, version):
+        if version == self._version:
+            return
+        if self._entries:
+            self._count("invalidations")
+        self._entries.clear()
+        self._by_term.clear()
+        self._version = version
+
+    def _drop(self, key: str):
+        terms, _ = self._entries.pop(key)
+        for term in terms:
+            keys = self._by_term.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_term[term]
+
+    def _nearest(self, terms: frozenset):
+        candidates = set()
+        for term in terms:
+            candidates |= self._by_term.get(term, set())
+        best_key, best_score = None, 0.0
+        for key in candidates:
+            score = jaccard(terms, self._entries[key][0])
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key if best_key is not None and best_score >= self.similarity else None
+
+    @staticmethod
+    def _key(query: str, scope: str):
+        # Terms are prefixed with the scope (the retrieval settings) so
+        # near-duplicate matching never crosses scopes.
+        terms = frozenset(f"{scope}|{term}" for term in query_terms(query))
+        return " ".join(sorted(terms)), terms
+
+    def get(self, query: str, version, scope: str = ""):
+        """The cached result for `query` at corpus `version`, or None."""
+        key, terms = self._key(query, scope)
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._count("hits")
+                return self._entries[key][1]
+            if self.similarity < 1:
+                near = self._nearest(terms)
+                if near is not None:
+                    self._entries.move_to_end(near)
+                    self._count("near_hits")
+                    return self._entries[near][1]
+            self._count("misses")
+            return None
+
+    def set(self, query: str, version, result, scope: str = ""):
+        """Cache `result` for `query`, unless the corpus has moved past `version`."""
+        key, terms = self._key(query, scope)
+        with self._lock:
+            # The lookup that preceded this saw `version`; if a later lookup
+            # has seen a newer one, this result may already be stale.
+            if version != self._version:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (terms, result)
+            for term in terms:
+                self._by_term[term].add(key)
+            while len(self._entries) > self.max_items:
+                self._drop(next(iter(self._entries)))
+                self._count("evictions")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            entries = len(self._entries)
+        lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+        return {
+            **stats,
+            "entries": entries,
+            "hit_rate": round((stats["hits"] + stats["near_hits"]) / lookups, 4) if lookups else 0.0,
+        }
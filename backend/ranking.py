@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a Gemini token in characters of JSON/English text. Only used
+# to size shards, so it errs on the small side.
+CHARS_PER_TOKEN = 3.5
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def candidate_summary(doc: dict, max_chars: int) -> dict:
+    """Compact view of a document used when asking the LLM to rank documents."""
+    description = doc.get("description", "") or ""
+    if len(description) > max_chars:
+        description = description[:max_chars].rstrip() + "..."
+    return {
+        "id": doc["id"],
+        "title": doc.get("title", ""),
+        "authors": doc.get("authors", []),
+        "tags": doc.get("tags", []),
+        "description": description,
+    }
+
+def make_shards(docs: list, budget_tokens: int, max_chars: int) -> list:
+    """
+    Split `docs` into consecutive groups whose candidate summaries fit in
+    `budget_tokens`. A document larger than the budget on its own gets a
+    shard to itself.
+    """
+    shards, current, used = [], [], 0
+    for doc in docs:
+        size = estimate_tokens(json.dumps(candidate_summary(doc, max_chars))) + 1
+        if current and used + size > budget_tokens:
+            shards.append(current)
+            current, used = [], 0
+        current.append(doc)
+        used += size
+    if current:
+        shards.append(current)
+    return shards
+
+def fitting(docs: list, budget_tokens: int, max_chars: int) -> list:
+    """The leading documents of `docs` whose summaries fit in one prompt of `budget_tokens`."""
+    shards = make_shards(docs, budget_tokens, max_chars)
+    return shards[0] if shards else []
+
+async def sharded_rank(query: str, docs: list, rank, top_n: int, budget_tokens: int, max_chars: int):
+    """
+    Map-reduce ranking for document sets too large for one prompt.
+
+    `docs` are split into shards of at most `budget_tokens` (see
+    make_shards) and every shard is ranked concurrently by
+    `await rank(query, shard_docs, top_n)`, which returns (doc_id,
+    relevance) pairs. The shard winners, best shard scores first, are then
+    ranked together in one final call; winners that would not fit in that
+    prompt are the lowest scoring and are dropped. So a query always takes
+    two rounds of calls, however large the corpus. A shard whose call fails
+    is skipped; the error is only raised if every shard failed. Returns
+    ((doc_id, relevance) pairs best first, complete), where complete is
+    False if any call failed and the ranking is only partial.
+    """
+    shards = make_shards(docs, budget_tokens, max_chars)
+    if len(shards) <= 1:
+        return await rank(query, docs, top_n), True
+
+    results = await asyncio.gather(*(rank(query, shard, top_n) for shard in shards), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if len(failures) == len(results):
+        raise failures[0]
+    for failure in failures:
+        logger.error(f"Ranking shard failed, skipping it: {failure}")
+
+    by_id = {doc["id"]: doc for doc in docs}
+    scores = {}
+    for result in results:
+        if isinstance(result, BaseException):
+            continue
+        for doc_id, relevance in result:
+            if doc_id in by_id:
+                scores[doc_id] = max(relevance, scores.get(doc_id, relevance))
+    if not scores:
+        return [], False
+    merged = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    finalists = fitting([by_id[doc_id] for doc_id, _ in merged], budget_tokens, max_chars)
+    logger.debug(f"Ranked {len(docs)} documents in {len(shards)} shards; "
+                 f"{len(finalists)} of {len(merged)} winners go to the final pass")
+    complete = not failures
+    try:
+        ranked = await rank(query, finalists, top_n)
+    except Exception as e:
+        logger.error(f"Final ranking pass failed, using shard scores: {e}")
+        ranked = []
+        complete = False
+    # Places the final pass did not fill (it failed, or fewer than top_n
+    # winners fit in its prompt) go to the best remaining shard scores.
+    chosen = {doc_id for doc_id, _ in ranked}
+    return (ranked + [item for item in merged if item[0] not in chosen])[:top_n], complete
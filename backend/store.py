@@ -0,0 +1,383 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from common import metrics
+
+logger = logging.getLogger(__name__)
+
+def load_json(file_path):
+    if os.path.exists(file_path):
+        with metrics.stage("json_parse"), open(file_path, "r") as f:
+            return json.load(f)
+    return {}
+
+def save_json(file_path, data):
+    tmp_path = f"{file_path}.tmp"
+    with metrics.stage("json_save"):
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, file_path)
+
+class JsonDocumentStore:
+    """
+    The original storage model: the whole corpus lives in documents.json and
+    is rewritten on every change. Kept for small deployments and as the
+    migration source for SqliteDocumentStore. Writes from several processes
+    would overwrite each other, so it only suits a single backend worker.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._seq = 0
+        self._changes = []      # (seq, doc_id) for writes made through this instance
+        self._reload_seq = 0    # seq at which the file was last reloaded from disk
+        self._load()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        self._documents = load_json(self.path)
+        self._by_url = {d["url"]: d["id"] for d in self._documents.values()}
+        self._loaded_stat = self._stat()
+
+    def version(self) -> str:
+        """
+        Identifies the current contents: the file's mtime and size. If
+        another process has rewritten the file since it was loaded, it is
+        reloaded first.
+        """
+        with self._lock:
+            stat = self._stat()
+            if stat != self._loaded_stat:
+                self._load()
+                self._seq += 1
+                self._reload_seq = self._seq
+            return "{}-{}".format(*stat) if stat else "0"
+
+    def _record(self, doc_id: str):
+        self._seq += 1
+        self._changes.append((self._seq, doc_id))
+        del self._changes[:-1000]
+
+    def last_change(self) -> int:
+        with self._lock:
+            return self._seq
+
+    def changes_since(self, seq: int):
+        """
+        (latest_seq, ids of documents written since `seq`). The id list is
+        None when the changes are unknown, because the file was rewritten
+        by another process, so the caller must reload everything.
+        """
+        self.version()
+        with self._lock:
+            oldest = self._changes[0][0] if self._changes else self._seq + 1
+            if seq < self._reload_seq or seq < oldest - 1:
+                return self._seq, None
+            return self._seq, list(dict.fromkeys(doc_id for s, doc_id in self._changes if s > seq))
+
+    def __len__(self):
+        return len(self._documents)
+
+    def get(self, doc_id: str):
+        return self._documents.get(doc_id)
+
+    def get_many(self, doc_ids):
+        return [self._documents[i] for i in doc_ids if i in self._documents]
+
+    def all(self):
+        with self._lock:
+            return list(self._documents.values())
+
+    def find_by_url(self, url: str):
+        doc_id = self._by_url.get(str(url))
+        return self._documents.get(doc_id) if doc_id else None
+
+    def find_by_hash(self, content_hash: str):
+        with self._lock:
+            return [d for d in self._documents.values() if d.get("content_hash") == content_hash]
+
+    def find_by_tag(self, tag: str):
+        with self._lock:
+            return [d for d in self._documents.values() if tag in (d.get("tags") or [])]
+
+    def count_pdf_refs(self, pdf_file: str) -> int:
+        with self._lock:
+            return sum(1 for d in self._documents.values() if d.get("pdf_file") == pdf_file)
+
+    def put(self, doc: dict):
+        with metrics.stage("store_write"), self._lock:
+            previous = self._documents.get(doc["id"])
+            if previous is not None and self._by_url.get(previous["url"]) == doc["id"]:
+                del self._by_url[previous["url"]]
+            self._documents[doc["id"]] = doc
+            self._by_url[doc["url"]] = doc["id"]
+            save_json(self.path, self._documents)
+            self._loaded_stat = self._stat()
+            self._record(doc["id"])
+
+    def put_many(self, docs):
+        """Store several documents with a single rewrite of the file."""
+        with metrics.stage("store_write"), self._lock:
+            for doc in docs:
+                previous = self._documents.get(doc["id"])
+                if previous is not None and self._by_url.get(previous["url"]) == doc["id"]:
+                    del self._by_url[previous["url"]]
+                self._documents[doc["id"]] = doc
+                self._by_url[doc["url"]] = doc["id"]
+                self._record(doc["id"])
+            save_json(self.path, self._documents)
+            self._loaded_stat = self._stat()
+
+    def delete(self, doc_id: str):
+        with metrics.stage("store_write"), self._lock:
+            doc = self._documents.pop(doc_id, None)
+            if doc is None:
+                return None
+            if self._by_url.get(doc["url"]) == doc_id:
+                del self._by_url[doc["url"]]
+            save_json(self.path, self._documents)
+            self._loaded_stat = self._stat()
+            self._record(doc_id)
+            return doc
+
+class SqliteDocumentStore:
+    """
+    Document store backed by SQLite in WAL mode. Each document is written in
+    its own transaction, so the cost of a write does not depend on corpus
+    size, and url, content_hash, pdf_file, date and tags are indexed for
+    lookups. The full document is kept as JSON in `data`; the other columns are the
+    indexed copies of its fields.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        id TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        content_hash TEXT,
+        pdf_file TEXT,
+        date TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_documents_url ON documents(url);
+    CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
+    CREATE INDEX IF NOT EXISTS idx_documents_date ON documents(date);
+    CREATE TABLE IF NOT EXISTS document_tags (
+        doc_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+        tag TEXT NOT NULL,
+        PRIMARY KEY (doc_id, tag)
+    );
+    CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags(tag);
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        doc_id TEXT NOT NULL
+    );
+    """
+
+    # How many entries of the change log are kept. A reader further behind
+    # than this reloads everything instead.
+    CHANGE_LOG_SIZE = 10000
+
+    # Columns added after the first schema version, with the SQL that
+    # back-fills them from the stored JSON.
+    ADDED_COLUMNS = {
+        "pdf_file": "UPDATE documents SET pdf_file = json_extract(data, '$.pdf_file')",
+    }
+
+    def __init__(self, path: str, migrate_from: str = None):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        self._upgrade_schema()
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('instance', lower(hex(randomblob(8))))")
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0')")
+        if migrate_from:
+            self._migrate_json(migrate_from)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly with BEGIN.
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    def _upgrade_schema(self):
+        with self._transaction() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            for column, backfill in self.ADDED_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE documents ADD COLUMN {column} TEXT")
+                    conn.execute(backfill)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_pdf_file ON documents(pdf_file)")
+
+    def _migrate_json(self, json_path: str):
+        """One-time import of an existing documents.json."""
+        if not os.path.exists(json_path):
+            return
+        with self._transaction() as conn:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if done:
+                return
+            docs = load_json(json_path)
+            for doc in docs.values():
+                self._write(conn, doc)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (json_path,))
+            # Readers opened before the import have to reload everything.
+            conn.execute("DELETE FROM changes")
+            self._bump_version(conn)
+        logger.debug(f"Migrated {len(docs)} documents from {json_path} to {self.path}")
+
+    @staticmethod
+    def _write(conn, doc: dict):
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (id, url, content_hash, pdf_file, date, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (doc["id"], doc["url"], doc.get("content_hash"), doc.get("pdf_file"), doc.get("date"), json.dumps(doc)),
+        )
+        conn.execute("DELETE FROM document_tags WHERE doc_id = ?", (doc["id"],))
+        tags = {str(t) for t in (doc.get("tags") or []) if t}
+        conn.executemany(
+            "INSERT INTO document_tags (doc_id, tag) VALUES (?, ?)",
+            [(doc["id"], tag) for tag in tags],
+        )
+
+    @classmethod
+    def _bump_version(cls, conn, doc_id: str = None):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        if doc_id is not None:
+            seq = conn.execute("INSERT INTO changes (doc_id) VALUES (?)", (doc_id,)).lastrowid
+            conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - cls.CHANGE_LOG_SIZE,))
+
+    def last_change(self) -> int:
+        row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def changes_since(self, seq: int):
+        """
+        (latest_seq, ids of documents written since `seq`). The id list is
+        None when `seq` is older than the retained log, in which case the
+        caller must reload everything.
+        """
+        conn = self._conn()
+        latest = self.last_change()
+        if latest <= seq:
+            return latest, []
+        oldest = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+        if oldest is None or oldest > seq + 1:
+            return latest, None
+        rows = conn.execute("SELECT doc_id FROM changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        return latest, list(dict.fromkeys(row[0] for row in rows))
+
+    def version(self) -> str:
+        """Database instance id plus the write counter, e.g. "3f2a...-42"."""
+        rows = dict(self._conn().execute("SELECT key, value FROM meta WHERE key IN ('instance', 'version')"))
+        return f"{rows.get('instance', '')}-{rows.get('version', 0)}"
+
+    def _fetch(self, sql: str, params=()):
+        rows = self._conn().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def get(self, doc_id: str):
+        docs = self._fetch("SELECT data FROM documents WHERE id = ?", (doc_id,))
+        return docs[0] if docs else None
+
+    def get_many(self, doc_ids):
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return []
+        placeholders = ",".join("?" for _ in doc_ids)
+        found = {d["id"]: d for d in self._fetch(f"SELECT data FROM documents WHERE id IN ({placeholders})", doc_ids)}
+        return [found[i] for i in doc_ids if i in found]
+
+    def all(self):
+        return self._fetch("SELECT data FROM documents")
+
+    def find_by_url(self, url: str):
+        docs = self._fetch("SELECT data FROM documents WHERE url = ? LIMIT 1", (str(url),))
+        return docs[0] if docs else None
+
+    def find_by_hash(self, content_hash: str):
+        return self._fetch("SELECT data FROM documents WHERE content_hash = ?", (content_hash,))
+
+    def find_by_tag(self, tag: str):
+        return self._fetch(
+            "SELECT d.data FROM documents d JOIN document_tags t ON t.doc_id = d.id WHERE t.tag = ?",
+            (tag,),
+        )
+
+    def count_pdf_refs(self, pdf_file: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM documents WHERE pdf_file = ?", (pdf_file,)).fetchone()[0]
+
+    def put(self, doc: dict):
+        with metrics.stage("store_write"), self._transaction() as conn:
+            self._write(conn, doc)
+            self._bump_version(conn, doc["id"])
+
+    def put_many(self, docs):
+        """Store several documents in one transaction."""
+        with metrics.stage("store_write"), self._transaction() as conn:
+            for doc in docs:
+                self._write(conn, doc)
+                self._bump_version(conn, doc["id"])
+
+    def delete(self, doc_id: str):
+        with metrics.stage("store_write"), self._transaction() as conn:
+            row = conn.execute("SELECT data FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self._bump_version(conn, doc_id)
+        return json.loads(row[0])
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block of statements."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+def open_store(config: dict, pdf_dir: str):
+    """
+    Open the document store selected by `document_store` in the config
+    ("sqlite" by default, or "json" for the legacy documents.json file).
+    """
+    backend = (config.get("document_store") or "sqlite").lower()
+    json_path = os.path.join(pdf_dir, "documents.json")
+    if backend == "json":
+        return JsonDocumentStore(json_path)
+    if backend == "sqlite":
+        return SqliteDocumentStore(os.path.join(pdf_dir, "documents.db"), migrate_from=json_path)
+    raise ValueError(f"Unknown document_store '{backend}'")
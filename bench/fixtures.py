@@ -0,0 +1,141 @@
+import hashlib
+import random
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VOCABULARY = (
+    "ethereum validator consensus rollup sharding proposer builder separation blob "
+    "gas fee market account abstraction verkle trie stateless client execution layer "
+    "beacon chain finality slashing withdrawal staking pool mev relay bundle "
+    "calldata compression zk proof prover circuit optimistic fraud dispute bridge "
+    "light client sync committee attestation aggregation signature bls kzg commitment "
+    "eip upgrade hard fork devnet testnet mainnet specification research governance "
+    "grant ecosystem tooling wallet security audit incident postmortem roadmap"
+).split()
+TAGS = ("research", "protocol", "scaling", "security", "governance", "ecosystem", "zk", "staking")
+
+def make_document(rng: random.Random, number: int) -> dict:
+    """One synthetic document shaped like what ingestion stores."""
+    title = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(3, 8))).title()
+    description = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(60, 160)))
+    content_hash = hashlib.sha256(f"doc-{number}".encode()).hexdigest()
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "url": f"https://fixture.invalid/doc/{number}",
+        "pdf_file": f"{content_hash}.pdf",
+        "content_hash": content_hash,
+        "description": description,
+        "title": title,
+        "date": f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "authors": [f"Author {rng.randint(1, 500)}" for _ in range(rng.randint(1, 3))],
+        "tags": rng.sample(TAGS, rng.randint(1, 3)),
+    }
+
+def make_corpus(size: int, seed: int = 0, start: int = 0):
+    """Documents number `start` .. `start + size - 1` of the corpus for `seed`."""
+    rng = random.Random(f"{seed}-{start}")
+    return [make_document(rng, number) for number in range(start, start + size)]
+
+def make_queries(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 6))) for _ in range(count)]
+
+def page_html(number: int) -> str:
+    rng = random.Random(number)
+    paragraphs = "".join(
+        "<p>{}</p>".format(" ".join(rng.choice(VOCABULARY) for _ in range(80))) for _ in range(6)
+    )
+    return (
+        f"<html><head><title>Fixture page {number}</title></head><body>"
+        f"<nav>Home | Docs</nav><main><h1>Fixture page {number}</h1>{paragraphs}</main>"
+        f"<footer>generated</footer></body></html>"
+    )
+
+class FixtureSite:
+    """
+    Static site on 127.0.0.1 serving `pages` synthetic HTML pages at
+    /page/<n>, with ETags so conditional requests get 304s.
+    """
+
+    def __init__(self, pages: int = 100):
+        self.pages = pages
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    number = int(self.path.rstrip("/").rsplit("/", 1)[-1])
+                except ValueError:
+                    number = -1
+                if not self.path.startswith("/page/") or not 0 <= number < site.pages:
+                    self.send_error(404)
+                    return
+                body = page_html(number).encode("utf-8")
+                etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fixture-site", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def urls(self):
+        return [f"{self.base_url}/page/{n}" for n in range(self.pages)]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(number: int, pages: int = 3) -> bytes:
+    """A small, valid multi-page text PDF, written without any PDF library."""
+    rng = random.Random(f"pdf-{number}")
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = [" ".join(rng.choice(VOCABULARY) for _ in range(10)) for _ in range(30)]
+        text = " ".join(f"({_pdf_escape(line)}) Tj T*" for line in [f"Document {number} page {page + 1}"] + lines)
+        stream = f"BT /F1 10 Tf 14 TL 50 780 Td {text} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
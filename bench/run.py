@@ -0,0 +1,343 @@
+"""
+Offline benchmarks for the ingestion, query and chat paths.
+
+Everything runs against local stand-ins: the dummy LLM provider (with
+configurable latency and output size), a static fixture site on
+127.0.0.1 and synthetic corpora. The backend is imported in a scratch
+directory with its own config, so the real data/ directory is never
+touched. Results are written as JSON for comparison between runs.
+
+    python -m bench.run --sizes 100,1000,10000 --llm-latency-ms 200
+"""
+
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import yaml
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from bench.fixtures import FixtureSite, make_corpus, make_pdf, make_queries  # noqa: E402
+
+SUITES = ("save_json", "ingest", "query", "chat")
+
+def percentiles(samples):
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+def write_config(workdir: str, args, llm_rerank: bool = False):
+    """
+    Scratch config: the repo's config with the dummy provider and no
+    caching, so query timings measure retrieval and ranking, not cache hits.
+    """
+    with open(os.path.join(PROJECT_ROOT, "config", "config.yaml"), "r") as f:
+        config = yaml.safe_load(f)
+    config.update({
+        "long_context_llm": "dummy",
+        "document_store": "sqlite",
+        "llm_cache": {"enabled": False},
+        "query_cache": {"enabled": False},
+    })
+    config["retrieval"] = {**(config.get("retrieval") or {}), "llm_rerank": llm_rerank}
+    config["llm_limits"] = {
+        **(config.get("llm_limits") or {}),
+        "max_concurrency": args.llm_concurrency,
+        "default_model_concurrency": args.llm_concurrency,
+        "requests_per_minute": 10 ** 9,
+        "burst": 10 ** 6,
+    }
+    os.makedirs(os.path.join(workdir, "config"), exist_ok=True)
+    with open(os.path.join(workdir, "config", "config.yaml"), "w") as f:
+        yaml.safe_dump(config, f)
+
+def import_backend(workdir: str, args):
+    """Import backend.main with `workdir` as its working directory."""
+    write_config(workdir, args)
+    os.environ["DUMMY_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["DUMMY_LLM_OUTPUT_CHARS"] = str(args.llm_output_chars)
+    os.chdir(workdir)
+    from backend import main
+    return main
+
+# --- save_json ---
+
+def bench_save_json(args, sizes):
+    """Cost of one document write against corpus size, JSON file vs SQLite."""
+    from backend.store import JsonDocumentStore, SqliteDocumentStore, load_json
+
+    results = []
+    for size in sizes:
+        scratch = tempfile.mkdtemp(prefix="bench-store-")
+        try:
+            corpus = make_corpus(size)
+            row = {"corpus_size": size}
+            for name, store in (
+                ("json", JsonDocumentStore(os.path.join(scratch, "documents.json"))),
+                ("sqlite", SqliteDocumentStore(os.path.join(scratch, "documents.db"))),
+            ):
+                store.put_many(corpus)
+                samples = []
+                for i in range(args.writes):
+                    doc = {**corpus[i % len(corpus)], "description": f"updated {i}"}
+                    started = time.perf_counter()
+                    store.put(doc)
+                    samples.append(time.perf_counter() - started)
+                row[f"{name}_put"] = percentiles(samples)
+            started = time.perf_counter()
+            load_json(os.path.join(scratch, "documents.json"))
+            row["json_load_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            row["json_file_bytes"] = os.path.getsize(os.path.join(scratch, "documents.json"))
+            results.append(row)
+            print(f"save_json: {size} docs, json put p50 {row['json_put']['p50_ms']} ms, "
+                  f"sqlite put p50 {row['sqlite_put']['p50_ms']} ms")
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+# --- ingest ---
+
+def bench_ingest(main, args):
+    """Documents per second through the upload and URL ingestion paths."""
+    from backend import changes, crawl
+
+    results = {}
+
+    # Upload path: PDF already on disk, then page extraction and LLM analysis.
+    uploads = []
+    for n in range(args.ingest_docs):
+        data = make_pdf(n)
+        content_hash = hashlib.sha256(data).hexdigest()
+        tmp_path = os.path.join(main.PDF_DIR, f".{uuid.uuid4()}.pdf.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        doc_id = str(uuid.uuid4())
+        uploads.append((doc_id, main.pdf_blobs.put(tmp_path, content_hash, holder=doc_id), content_hash))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        statuses = list(executor.map(lambda u: main.ingest_pdf(*u)[0], uploads))
+    elapsed = time.perf_counter() - started
+    results["upload"] = {
+        "documents": len(uploads),
+        "added": statuses.count("added"),
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_second": round(len(uploads) / elapsed, 3) if elapsed else None,
+    }
+    print(f"ingest/upload: {results['upload']['docs_per_second']} docs/s")
+
+    with FixtureSite(pages=args.ingest_docs) as site:
+        urls = site.urls()
+
+        # Change check used before re-rendering a known URL.
+        validators = {}
+        started = time.perf_counter()
+        for url in urls:
+            validators[url] = changes.check_url(url)[1]
+        first = time.perf_counter() - started
+        started = time.perf_counter()
+        statuses = [changes.check_url(url, validators[url])[0] for url in urls]
+        second = time.perf_counter() - started
+        results["change_check"] = {
+            "urls": len(urls),
+            "first_fetch_per_second": round(len(urls) / first, 3) if first else None,
+            "conditional_per_second": round(len(urls) / second, 3) if second else None,
+            "not_modified": statuses.count("not_modified"),
+        }
+        print(f"ingest/change_check: {results['change_check']['conditional_per_second']} checks/s")
+
+        # Full URL path: headless render, PDF, analysis. Needs Playwright.
+        if importlib.util.find_spec("playwright") is None:
+            results["crawl"] = {"skipped": "playwright is not installed"}
+        else:
+            checkpoint = crawl.Checkpoint(os.path.join(main.PDF_DIR, "bench_checkpoint.json"))
+            try:
+                results["crawl"] = crawl.crawl_urls(main.process_page, urls, checkpoint, **main.get_crawl_options({
+                    "concurrency": args.concurrency, "per_host": args.concurrency, "host_delay_seconds": 0,
+                }))
+            finally:
+                main.browser_pool.close()
+            print(f"ingest/crawl: {results['crawl'].get('pages_per_second')} pages/s")
+    return results
+
+# --- query ---
+
+def bench_query(main, args, workdir, sizes):
+    """/query/select_advanced latency against corpus size, with and without LLM rerank."""
+    queries = make_queries(args.queries)
+    results = []
+    loaded = len(main.store)
+    for size in sizes:
+        if size > loaded:
+            for start in range(loaded, size, 5000):
+                main.store.put_many(make_corpus(min(5000, size - start), start=start))
+            loaded = size
+        started = time.perf_counter()
+        main.sync_index()
+        row = {"corpus_size": size, "index_sync_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+        for rerank in (False, True):
+            write_config(workdir, args, llm_rerank=rerank)
+
+            async def run():
+                samples = []
+                for query in queries:
+                    request = main.QuerySelectAdvancedRequest(query=query)
+                    started = time.perf_counter()
+                    await main.query_select_advanced(request)
+                    samples.append(time.perf_counter() - started)
+                return samples
+
+            row["llm_rerank" if rerank else "bm25"] = percentiles(asyncio.run(run()))
+        results.append(row)
+        print(f"query: {size} docs, bm25 p50 {row['bm25']['p50_ms']} ms / p99 {row['bm25']['p99_ms']} ms, "
+              f"rerank p50 {row['llm_rerank']['p50_ms']} ms")
+    write_config(workdir, args)
+    return results
+
+# --- chat ---
+
+def load_frontend_prompts():
+    spec = importlib.util.spec_from_file_location("frontend_prompts", os.path.join(PROJECT_ROOT, "frontend", "prompts.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def bench_chat(main, args):
+    """
+    The work behind frontend /chat and /chat/stream: page retrieval from the
+    page index, prompt building and the model call through the gateway.
+    """
+    prompts = load_frontend_prompts()
+    llm = main.get_llm_service()
+    pdf_file = f"bench-{uuid.uuid4().hex}.pdf"
+    pages = [" ".join(make_queries(1, seed=page)[0].split() * 40) for page in range(args.chat_pages)]
+    main.page_store.add(pdf_file, pages)
+    questions = make_queries(args.queries, seed=7)
+
+    answer, first_token = [], []
+    for question in questions:
+        started = time.perf_counter()
+        retrieved = main.page_store.search(pdf_file, question, top_k=4)
+        llm.generate([prompts.build_pages_prompt(question, retrieved)], json_output=True)
+        answer.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        retrieved = main.page_store.search(pdf_file, question, top_k=4)
+        for _ in llm.stream([prompts.build_stream_prompt(question, retrieved)]):
+            first_token.append(time.perf_counter() - started)
+            break
+    main.page_store.remove(pdf_file)
+    results = {"pages": args.chat_pages, "answer": percentiles(answer), "stream_first_token": percentiles(first_token)}
+    print(f"chat: answer p50 {results['answer']['p50_ms']} ms, first token p50 "
+          f"{results['stream_first_token']['p50_ms']} ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion, query and chat benchmarks.")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="Run only this suite (repeatable)")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Corpus sizes, e.g. 100,1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200, help="Queries (and chat questions) per measurement")
+    parser.add_argument("--writes", type=int, default=20, help="Single-document writes per save_json measurement")
+    parser.add_argument("--ingest-docs", type=int, default=50, help="Documents/pages for the ingestion suite")
+    parser.add_argument("--chat-pages", type=int, default=40, help="Pages in the synthetic chat document")
+    parser.add_argument("--concurrency", type=int, default=4, help="Ingestion worker threads")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Dummy provider latency per call")
+    parser.add_argument("--llm-output-chars", type=int, default=400, help="Dummy provider output size")
+    parser.add_argument("--llm-concurrency", type=int, default=16, help="LLM gateway concurrency limit")
+    parser.add_argument("--output", help="Result file (default bench/results/<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args()
+
+    suites = args.suite or list(SUITES)
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+    output = args.output or os.path.join(
+        PROJECT_ROOT, "bench", "results", datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json"
+    )
+    output = os.path.abspath(output)
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {**vars(args), "sizes": sizes, "suites": suites},
+        "results": {},
+    }
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    cwd = os.getcwd()
+
+    def run_suite(name, suite, *suite_args):
+        # A failing suite is recorded and the others still run.
+        try:
+            report["results"][name] = suite(*suite_args)
+        except Exception as e:
+            traceback.print_exc()
+            report["results"][name] = {"error": f"{type(e).__name__}: {e}"}
+
+    try:
+        if "save_json" in suites:
+            run_suite("save_json", bench_save_json, args, sizes)
+        if any(s in suites for s in ("ingest", "query", "chat")):
+            backend = import_backend(workdir, args)
+            if "ingest" in suites:
+                run_suite("ingest", bench_ingest, backend, args)
+            if "query" in suites:
+                run_suite("query", bench_query, backend, args, workdir, sizes)
+            if "chat" in suites:
+                run_suite("chat", bench_chat, backend, args)
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Scratch directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        # Written even if a suite or the backend import failed, so the
+        # results gathered so far are kept.
+        report["finished_at"] = datetime.now(timezone.utc).isoformat()
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
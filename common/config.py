@@ -0,0 +1,69 @@
+import logging
+import os
+import threading
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join("config", "config.yaml")
+
+class Config:
+    """
+    A YAML config file parsed once and re-parsed only when the file changes.
+
+    `get()` costs one stat() of the file; when its mtime or size differ from
+    the loaded version the file is parsed again, so edits take effect
+    without a restart. If the edited file cannot be parsed the last good
+    config is kept. Callers must treat the returned dict as read-only.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stat = None
+        self._data = None
+
+    def _file_stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self) -> dict:
+        stat = self._file_stat()
+        if stat == self._stat:
+            return self._data
+        with self._lock:
+            if stat != self._stat:
+                try:
+                    with open(self.path, "r") as f:
+                        data = yaml.safe_load(f) or {}
+                except yaml.YAMLError as e:
+                    if self._data is None:
+                        raise
+                    logger.error(f"Keeping previous config, {self.path} is invalid: {e}")
+                else:
+                    if self._data is not None:
+                        logger.info(f"Reloaded {self.path}")
+                    self._data = data
+                self._stat = stat
+            return self._data
+
+    def section(self, name: str) -> dict:
+        """A top-level mapping such as `retrieval`; empty if missing or null."""
+        return self.get().get(name, {}) or {}
+
+_configs = {}
+_configs_lock = threading.Lock()
+
+def get_config(path: str = DEFAULT_PATH) -> Config:
+    """The process-wide Config for `path` (relative paths resolve against the working directory)."""
+    key = os.path.abspath(path)
+    with _configs_lock:
+        config = _configs.get(key)
+        if config is None:
+            config = _configs[key] = Config(key)
+        return config
+
+def load_config(path: str = DEFAULT_PATH) -> dict:
+    """Current contents of the config file at `path`."""
+    return get_config(path).get()
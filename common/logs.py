@@ -0,0 +1,34 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+_configured = False
+
+def queued(*handlers) -> QueueHandler:
+    """
+    A handler that only puts records on a queue; a background listener
+    thread formats them and does the (possibly slow) writes to `handlers`.
+    """
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return QueueHandler(records)
+
+def configure_logging(level: str = "INFO"):
+    """
+    Send the root logger to stderr through a queue, so logging calls on
+    request and worker threads never block on I/O. Only the first call has
+    an effect.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    root.addHandler(queued(console))
@@ -0,0 +1,195 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Exposition format served by the /metrics endpoints.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a fast SQLite write up to a slow page render or LLM call.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [("_total", key, (), value) for key, value in sorted(self._values.items())]
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. Instead of being set, a gauge can read
+    its value from `set_function(fn)` at scrape time; fn returns a number,
+    or a {label values tuple: number} dict for labelled gauges.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                return []
+            values = value if isinstance(value, dict) else {(): value}
+            return [("", tuple(str(v) for v in key), (), v) for key, v in sorted(values.items())]
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block took, whether or not it raised."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    samples.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+                samples.append(("_sum", key, (), series["sum"]))
+                samples.append(("_count", key, (), series["count"]))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def get_or_create(self, cls, name: str, documentation: str, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Metrics are per process. Each service exposes this registry on /metrics.
+REGISTRY = Registry()
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    return REGISTRY.get_or_create(Counter, name, documentation, labelnames)
+
+def gauge(name: str, documentation: str, labelnames=()) -> Gauge:
+    return REGISTRY.get_or_create(Gauge, name, documentation, labelnames)
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+# Shared instruments used across the backend, frontend and LLM packages.
+STAGE_SECONDS = histogram(
+    "ethqna_stage_seconds", "Time spent in each pipeline stage.", ("stage",)
+)
+LLM_CALL_SECONDS = histogram(
+    "ethqna_llm_call_seconds", "LLM request latency, including retries.", ("provider", "operation", "model")
+)
+ERRORS = counter("ethqna_errors_total", "Errors by component.", ("component",))
+HTTP_REQUEST_SECONDS = histogram(
+    "ethqna_http_request_seconds", "HTTP request latency by route.", ("service", "method", "route", "status")
+)
+
+def stage(name: str):
+    """Context manager timing one pipeline stage into ethqna_stage_seconds."""
+    return STAGE_SECONDS.time(stage=name)
+
+def render() -> str:
+    return REGISTRY.render()
@@ -1,10 +1,11 @@
 import os
+import sys
+import threading
 import random
 import time
 import json
 import hashlib
-import yaml
-import importlib
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from flask import (
     Flask,
@@ -15,9 +16,13 @@ from flask import (
     url_for,
     make_response,
     send_from_directory,
+    stream_with_context,
+    Response,
+    session,
     g
 )
 from dotenv import load_dotenv
+import requests
 from werkzeug.middleware.proxy_fix import ProxyFix
 from oauthlib.oauth2.rfc6749.errors import TokenExpiredError
 import logging
@@ -28,45 +33,101 @@ dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.e
 load_dotenv(dotenv_path)
 
 app = Flask(__name__)
-app.secret_key = "supersekrit"  # Replace with a secure key in production
 
 # Force Flask to generate HTTPS URLs and trust reverse-proxy headers.
 app.config['PREFERRED_URL_SCHEME'] = 'https'
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# Set up logging to a file stored in the data folder (mounted volume)
+# Shared packages (backend, LLM, common) live at the project root.
+project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(project_root)
+from common import metrics
+from common.config import get_config
+from common.logs import configure_logging, queued
+
+logger = logging.getLogger(__name__)
+
+# The session carries the OAuth token and the cached identity (including
+# whether the user is allowed in), so its signing key must stay secret.
+app.secret_key = os.environ.get("FLASK_SECRET_KEY")
+if not app.secret_key:
+    # Without a configured key sessions only last as long as this process
+    # and are not shared between workers.
+    app.secret_key = os.urandom(32)
+    logger.warning("FLASK_SECRET_KEY is not set; using a random session key")
+
+# Set up logging to a file stored in the data folder (mounted volume).
+# Records are written by a background thread, not in the request.
 usage_log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'usage.log')
 handler = RotatingFileHandler(usage_log_path, maxBytes=1_000_000, backupCount=5)
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 handler.setLevel(logging.INFO)
-app.logger.addHandler(handler)
+app.logger.addHandler(queued(handler))
+app.logger.setLevel(logging.INFO)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = getattr(g, "request_started", None)
+    if started is not None:
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, service="frontend", method=request.method,
+            route=request.url_rule.rule if request.url_rule else "unmatched", status=response.status_code,
+        )
+    return response
 
 @app.before_request
 def log_request_info():
-    # Default to unauthenticated
-    user_email = "unauthenticated"
-    try:
-        # Attempt to fetch Google user info only if the blueprint is ready.
-        from flask_dance.contrib.google import google
-        if google.authorized:
-            resp = google.get("/oauth2/v2/userinfo")
-            if resp.ok:
-                user_info = resp.json()
-                user_email = user_info.get("email", "unknown")
-    except Exception as e:
-        app.logger.error(f"Error fetching user info: {e}")
+    # Only the identity cached in the session is used here, so logging never
+    # calls Google; see get_identity().
+    identity = session.get("identity") or {}
+    user_email = identity.get("email", "unauthenticated")
     app.logger.info(f"{request.remote_addr} {request.method} {request.path} by {user_email}")
 
-# Load configuration for Gemini API from config/config.yaml
+# Load configuration from config/config.yaml
 config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'config.yaml')
-with open(config_path, 'r') as f:
-    config = yaml.safe_load(f)
-gemini_api_key_env_var = config.get('gemini_api_key_env_var', 'GEMINI_API_KEY')
-api_key = os.getenv(gemini_api_key_env_var)
+# Re-read when the file changes; settings used per request pick up edits
+# without a restart, the rest apply at startup.
+app_config = get_config(config_path)
+config = app_config.get()
+configure_logging((config.get('logging', {}) or {}).get('level', 'INFO'))
 
 # Import the prompt builder
-from prompts import build_prompt
+from prompts import build_prompt, build_pages_prompt, build_stream_prompt
+
+# The document store and LLM cache live in packages at the project root.
+from backend.store import open_store
+from backend.pages import PageStore
+from backend.blobs import PdfBlobStore
+from LLM.cache import content_hash, make_key, open_cache, sha256_text
+from LLM.gateway import configure_gateway, get_gateway
+from LLM.registry import get_registry
+
+documents_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'pdf_sources')
+os.makedirs(documents_dir, exist_ok=True)
+document_store = open_store(config, documents_dir)
+
+# Repeated questions about the same PDF are answered from the shared cache.
+llm_cache = open_cache(config, base_dir=project_root)
+
+# Chat calls go through the configured provider and the process-wide LLM
+# gateway, which bounds concurrency and retries rate-limited requests.
+configure_gateway(config.get('llm_limits'))
+providers = get_registry()
+
+def chat_service():
+    """The chat provider's LLMService and model. The provider is loaded on first use."""
+    current = app_config.get()
+    chat_llm = providers.service(current.get('long_context_llm', 'dummy'))
+    chat_model = (current.get('models', {}) or {}).get('chat') or chat_llm.model
+    return chat_llm, chat_model
+
+# Page text extracted at ingest; /chat sends only the best-matching pages.
+page_store = PageStore(os.path.join(documents_dir, 'pages.db'))
 
 # --- Google OAuth Setup using Flask-Dance ---
 from flask_dance.contrib.google import make_google_blueprint, google
@@ -83,100 +144,186 @@ google_bp = make_google_blueprint(
 )
 app.register_blueprint(google_bp, url_prefix="/login")
 
-# --- New Endpoint for PDF Documents ---
-@app.route("/documents")
-def documents_list():
-    documents_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'pdf_sources', 'documents.json')
-    print("Looking for documents.json at:", documents_path, flush=True)
-    if os.path.exists(documents_path):
-        try:
-            with open(documents_path, 'r') as f:
-                docs_dict = json.load(f)
-            docs_list = sorted(list(docs_dict.values()), key=lambda d: d.get("relevance", 0), reverse=True)
-            return jsonify({"documents": docs_list})
-        except Exception as e:
-            return jsonify({"documents": [], "error": f"Failed to load documents: {e}"}), 500
-    else:
-        return jsonify({"documents": []})
+ALLOWED_EMAIL_DOMAIN = "@ethereum.org"
+user_info_ttl = (config.get('auth', {}) or {}).get('user_info_ttl_seconds', 600)
 
-@app.route("/ethqna")
-def ethqna():
-    if not google.authorized:
-        return render_template("login.html")
-    try:
-        resp = google.get("/oauth2/v2/userinfo")
-    except TokenExpiredError:
-        return redirect(url_for("google.login"))
-    except Exception:
-        return redirect(url_for("google.login"))
+def token_fingerprint():
+    """Short hash of the current OAuth access token, or None when signed out."""
+    token = google_bp.token or {}
+    access_token = token.get("access_token")
+    if not access_token:
+        return None
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
+
+def get_identity():
+    """
+    The signed-in user's Google profile and domain check, cached in the
+    session. Google is only asked again once the cached entry is older than
+    `auth.user_info_ttl_seconds` or the access token has changed. Returns
+    None when the lookup fails; TokenExpiredError propagates.
+    """
+    fingerprint = token_fingerprint()
+    identity = session.get("identity")
+    if (identity and fingerprint and identity.get("token") == fingerprint
+            and identity.get("expires", 0) > time.time()):
+        return identity
+
+    session.pop("identity", None)
+    if fingerprint is None:
+        return None
+    resp = google.get("/oauth2/v2/userinfo")
     if not resp.ok:
-        return redirect(url_for("google.login"))
+        return None
     user_info = resp.json()
     email = user_info.get("email", "")
-    if not email.endswith("@ethereum.org"):
-        return "Access denied: You must use an ethereum.org email", 403
-    return render_template("ethqna.html", user=user_info)
+    identity = {
+        "email": email or "unknown",
+        "allowed": email.endswith(ALLOWED_EMAIL_DOMAIN),
+        "user": user_info,
+        "token": fingerprint,
+        "expires": time.time() + user_info_ttl,
+    }
+    session["identity"] = identity
+    return identity
 
-# --- Main Application Routes ---
-@app.route("/")
-def index():
+def render_for_user(template):
+    """Render `template` for a signed-in ethereum.org user, or send them to log in."""
     if not google.authorized:
+        session.pop("identity", None)
         return render_template("login.html")
     try:
-        resp = google.get("/oauth2/v2/userinfo")
+        identity = get_identity()
     except TokenExpiredError:
         return redirect(url_for("google.login"))
     except Exception:
         return redirect(url_for("google.login"))
-    if not resp.ok:
+    if identity is None:
         return redirect(url_for("google.login"))
-    user_info = resp.json()
-    email = user_info.get("email", "")
-    if not email.endswith("@ethereum.org"):
+    if not identity["allowed"]:
         return "Access denied: You must use an ethereum.org email", 403
-    return render_template("index.html", user=user_info)
+    return render_template(template, user=identity["user"])
+
+# --- New Endpoint for PDF Documents ---
+# The sorted, serialized document list is kept until the store's version
+# changes, so polling /documents costs one version lookup, and clients
+# holding the current ETag get a 304 with no body.
+documents_snapshot = {"version": None, "body": None}
+documents_snapshot_lock = threading.Lock()
+
+def documents_body(version):
+    with documents_snapshot_lock:
+        if documents_snapshot["version"] != version:
+            docs_list = sorted(document_store.all(), key=lambda d: d.get("relevance", 0), reverse=True)
+            documents_snapshot["body"] = json.dumps({"documents": docs_list})
+            documents_snapshot["version"] = version
+        return documents_snapshot["body"]
+
+@app.route("/documents")
+def documents_list():
+    try:
+        version = document_store.version()
+        body = documents_body(version)
+    except Exception as e:
+        return jsonify({"documents": [], "error": f"Failed to load documents: {e}"}), 500
+    response = Response(body, mimetype="application/json")
+    response.set_etag(f"docs-{version}")
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+@app.route("/ethqna")
+def ethqna():
+    return render_for_user("ethqna.html")
+
+# --- Main Application Routes ---
+@app.route("/")
+def index():
+    return render_for_user("index.html")
 
 @app.route("/logout")
 def logout():
     if google_bp.token:
         del google_bp.token
+    session.pop("identity", None)
     return redirect(url_for("index"))
 
-@app.route("/chat", methods=["POST"])
-def chat():
-    data = request.get_json()
-    user_message = data.get("message", "")
-    # Get the document filename from the request; default if not provided.
-    doc_filename = data.get("doc", "41dd8407-7914-4978-a078-8dc597d8fb86.pdf")
-    print(f"Received chat request: message='{user_message}', doc_filename='{doc_filename}'", flush=True)
-    pdf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'pdf_sources', doc_filename)
-    print(f"Computed PDF path: {pdf_path}", flush=True)
+def retrieve_pages(doc_filename, pdf_path, query):
+    """Top-scoring (page, text) pairs for the query, extracting the PDF's pages on first use."""
+    try:
+        with metrics.stage("page_retrieval"):
+            page_store.ensure(doc_filename, pdf_path)
+            pages = page_store.search(doc_filename, query, top_k=app_config.section('chat').get('top_pages', 4))
+        # Scanned PDFs have no extractable text; those still go to the model whole.
+        return [(number, text) for number, text in pages if text]
+    except Exception as e:
+        logger.error(f"Page retrieval failed for {doc_filename}, sending whole PDF: {e}")
+        metrics.ERRORS.inc(component="page_retrieval")
+        return []
+
+def cited_page(page_number, pages):
+    """Keep the model's page if it is one of the retrieved pages, else use the best match."""
+    retrieved = [number for number, _ in pages]
     try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        return retrieved[0]
+    return page_number if page_number in retrieved else retrieved[0]
+
+def build_chat_request(doc_filename, user_message, streaming=False):
+    """
+    Prepare the model input for a chat message about one PDF.
+    Returns (pages, contents, prompt, input_hash); `pages` is empty when the
+    whole PDF is sent instead of retrieved page excerpts.
+    """
+    pdf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'pdf_sources', doc_filename)
+    logger.debug(f"Computed PDF path: {pdf_path}")
+
+    # Prefer the best-matching pages over sending the whole PDF.
+    pages = retrieve_pages(doc_filename, pdf_path, user_message)
+    if pages:
+        if streaming:
+            prompt = build_stream_prompt(user_message, pages)
+        else:
+            prompt = build_pages_prompt(user_message, pages)
+        contents = [prompt]
+        input_hash = sha256_text(prompt)
+        logger.debug(f"Retrieved pages {[number for number, _ in pages]} from {doc_filename}")
+    else:
         with open(pdf_path, 'rb') as f:
             pdf_data = f.read()
-        print(f"Successfully read PDF file: {doc_filename}", flush=True)
-    except Exception as e:
-        print(f"Error reading PDF file at {pdf_path}: {e}", flush=True)
-        return jsonify({"response": f"Error reading PDF: {e}", "page": None})
+        logger.debug(f"Successfully read PDF file: {doc_filename}")
+        prompt = build_stream_prompt(user_message) if streaming else build_prompt(user_message)
+        contents = [pdf_data, prompt]
+        input_hash = content_hash(pdf_data)
+    logger.debug(f"Built enhanced prompt: {prompt}")
+    return pages, contents, prompt, input_hash
 
-    enhanced_prompt = build_prompt(user_message)
-    print(f"Built enhanced prompt: {enhanced_prompt}", flush=True)
+class ChatError(Exception):
+    """A chat answer could not be produced; the message is shown to the user."""
 
-    from google import genai
-    from google.genai import types
+def answer_document(doc_filename, user_message):
+    """
+    Answer a question about one PDF. Returns (answer_text, page_number);
+    raises ChatError if the PDF cannot be read or the model's answer cannot
+    be used.
+    """
+    try:
+        pages, contents, enhanced_prompt, input_hash = build_chat_request(doc_filename, user_message)
+    except Exception as e:
+        logger.error(f"Error reading PDF file {doc_filename}: {e}")
+        raise ChatError(f"Error reading PDF: {e}")
+    chat_llm, chat_model = chat_service()
 
-    client = genai.Client(api_key=api_key)
+    def generate():
+        return chat_llm.generate(contents, model=chat_model, json_output=True, operation="chat")
 
+    raw_response = None
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[
-                types.Part.from_bytes(data=pdf_data, mime_type='application/pdf'),
-                enhanced_prompt
-            ]
-        )
-        raw_response = response.text
-        print("Raw Gemini response:", raw_response, flush=True)
+        if llm_cache is not None:
+            key = make_key(chat_llm.provider_name, chat_model, enhanced_prompt, input_hash)
+            raw_response = llm_cache.get_or_compute(key, generate)
+        else:
+            raw_response = generate()
+        logger.debug("Raw Gemini response: %s", raw_response)
         cleaned_response = raw_response
         if cleaned_response.startswith("```"):
             lines = cleaned_response.splitlines()
@@ -185,24 +332,223 @@ def chat():
             if lines and lines[-1].strip().startswith("```"):
                 lines = lines[:-1]
             cleaned_response = "\n".join(lines).strip()
-            print("Cleaned Gemini response:", cleaned_response, flush=True)
-        parsed_response = json.loads(cleaned_response)
+            logger.debug("Cleaned Gemini response: %s", cleaned_response)
+        with metrics.stage("json_parse"):
+            parsed_response = json.loads(cleaned_response)
         answer_text = parsed_response.get("response", "")
         page_number = parsed_response.get("page", None)
-        combined_response = f"Answer: {answer_text} (Page {page_number})"
+        if pages:
+            page_number = cited_page(page_number, pages)
     except Exception as e:
-        print("Error parsing Gemini response:", raw_response, flush=True)
-        combined_response = f"Error calling Gemini API or parsing response: {e}"
+        logger.error("Error parsing Gemini response: %s", raw_response)
+        metrics.ERRORS.inc(component="chat")
+        raise ChatError(f"Error calling Gemini API or parsing response: {e}")
+    return answer_text, page_number
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    data = request.get_json()
+    user_message = data.get("message", "")
+    # Get the document filename from the request; default if not provided.
+    doc_filename = data.get("doc", "41dd8407-7914-4978-a078-8dc597d8fb86.pdf")
+    logger.debug(f"Received chat request: message='{user_message}', doc_filename='{doc_filename}'")
+
+    try:
+        answer_text, page_number = answer_document(doc_filename, user_message)
+        combined_response = f"Answer: {answer_text} (Page {page_number})"
+    except ChatError as e:
+        combined_response = str(e)
         page_number = None
 
-    print(f"Returning response: {combined_response}", flush=True)
+    logger.debug(f"Returning response: {combined_response}")
     return jsonify({'response': combined_response, 'page': page_number})
 
+# --- Multi-document chat ---
+# /chat/multi asks one question of several PDFs at once, one thread per
+# document, so it takes about as long as the slowest document rather than
+# the sum. LLM concurrency is still bounded by the gateway.
+chat_executor = ThreadPoolExecutor(
+    max_workers=(config.get('chat', {}) or {}).get('multi_max_workers', 8), thread_name_prefix="chat"
+)
+
+def backend_top_documents(query, top_k, timeout):
+    """Top documents for `query` from the backend's /query/select_advanced."""
+    backend_url = os.environ.get("BACKEND_URL") or app_config.section('chat').get('backend_url', 'http://backend:8000')
+    auth = (os.environ.get("ADMIN_USERNAME", "admin"), os.environ.get("ADMIN_PASSWORD", "secret"))
+    response = requests.post(f"{backend_url}/query/select_advanced", json={"query": query}, auth=auth, timeout=timeout)
+    response.raise_for_status()
+    return response.json().get("documents", [])[:top_k]
+
+def document_title(pdf_file):
+    """Title of the stored document whose PDF is `pdf_file`, or None."""
+    pdf_hash = PdfBlobStore.hash_of(pdf_file)
+    if pdf_hash:
+        for doc in document_store.find_by_hash(pdf_hash):
+            if doc.get("pdf_file") == pdf_file and doc.get("title"):
+                return doc["title"]
+    return None
+
+def multi_chat_error(message, status):
+    return jsonify({"response": message, "answers": [], "timed_out": []}), status
+
+@app.route("/chat/multi", methods=["POST"])
+def chat_multi():
+    """
+    Answer one message against several documents concurrently and merge the
+    answers, each with its own page citation. The documents are `docs` (PDF
+    file names, or objects with `pdf_file` and `title`) when given, else the
+    top `top_k` results of /query/select_advanced for the message.
+    Documents not answered within `chat.multi_deadline_seconds` are listed
+    under `timed_out`.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return multi_chat_error("Expected a JSON object", 400)
+    user_message = data.get("message", "")
+    chat_config = app_config.section('chat')
+    multi_top_k = chat_config.get('multi_top_k', 5)
+    multi_deadline_seconds = chat_config.get('multi_deadline_seconds', 60)
+    try:
+        top_k = max(1, min(int(data.get("top_k", multi_top_k)), multi_top_k))
+    except (TypeError, ValueError):
+        return multi_chat_error("top_k must be an integer", 400)
+    deadline = time.monotonic() + multi_deadline_seconds
+    logger.debug(f"Received multi-document chat request: message='{user_message}', top_k={top_k}")
+
+    if data.get("docs"):
+        if not isinstance(data["docs"], list):
+            return multi_chat_error("docs must be a list", 400)
+        documents = [doc if isinstance(doc, dict) else {"pdf_file": doc} for doc in data["docs"][:top_k]]
+        if not all(isinstance(doc.get("pdf_file"), str) and doc["pdf_file"] for doc in documents):
+            return multi_chat_error("Each entry of docs needs a pdf_file", 400)
+    else:
+        try:
+            documents = backend_top_documents(user_message, top_k, timeout=multi_deadline_seconds)
+        except Exception as e:
+            logger.error(f"Document selection for multi-document chat failed: {e}")
+            metrics.ERRORS.inc(component="chat")
+            return multi_chat_error(f"Error selecting documents: {e}", 502)
+
+    futures = {chat_executor.submit(answer_document, doc["pdf_file"], user_message): doc for doc in documents}
+    done, _ = wait(futures, timeout=max(0, deadline - time.monotonic()))
+
+    # Answers are kept in the order the documents were ranked. Calls still
+    # running at the deadline finish in the background and fill the cache.
+    answers, timed_out = [], []
+    for future, doc in futures.items():
+        title = doc.get("title") or document_title(doc["pdf_file"]) or doc["pdf_file"]
+        source = {"doc": doc["pdf_file"], "title": title}
+        if future not in done:
+            timed_out.append(source)
+        elif future.exception() is not None:
+            answers.append({**source, "response": str(future.exception()), "page": None, "error": True})
+        else:
+            answer_text, page_number = future.result()
+            answers.append({**source, "response": answer_text, "page": page_number, "error": False})
+
+    merged = "\n\n".join(
+        f"**{answer['title']}** (Page {answer['page']}): {answer['response']}"
+        for answer in answers if not answer["error"]
+    )
+    return jsonify({"response": merged, "answers": answers, "timed_out": timed_out})
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming variant of /chat. Answer text is forwarded as `token` events
+    while the model generates it, followed by a `done` event carrying the
+    page reference (or an `error` event).
+    """
+    data = request.get_json()
+    user_message = data.get("message", "")
+    doc_filename = data.get("doc", "41dd8407-7914-4978-a078-8dc597d8fb86.pdf")
+    logger.debug(f"Received streaming chat request: message='{user_message}', doc_filename='{doc_filename}'")
+
+    def events():
+        try:
+            pages, contents, prompt, input_hash = build_chat_request(doc_filename, user_message, streaming=True)
+        except Exception as e:
+            yield sse_event("error", {"message": f"Error reading PDF: {e}"})
+            return
+        page_number = pages[0][0] if pages else None
+
+        chat_llm, chat_model = chat_service()
+        key = make_key(chat_llm.provider_name, chat_model, prompt, input_hash)
+        cached = llm_cache.get(key) if llm_cache is not None else None
+        if cached is not None:
+            yield sse_event("token", {"text": cached})
+            yield sse_event("done", {"page": page_number})
+            return
+
+        answer = []
+        try:
+            for text in chat_llm.stream(contents, model=chat_model, operation="chat_stream"):
+                answer.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            logger.error(f"Error streaming Gemini response: {e}")
+            metrics.ERRORS.inc(component="chat")
+            yield sse_event("error", {"message": f"Error calling Gemini API: {e}"})
+            return
+        if llm_cache is not None:
+            llm_cache.set(key, "".join(answer))
+        yield sse_event("done", {"page": page_number})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        # Stop nginx from buffering the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+QUEUE_DEPTH = metrics.gauge("ethqna_queue_depth", "Work waiting in each queue.", ("queue",))
+QUEUE_DEPTH.set_function(lambda: {("llm_gateway",): get_gateway().snapshot()["waiting"]})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics for this process. nginx does not expose this route."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# PDFs are named by their content hash, so a given URL never changes and
+# can be cached forever; the hash doubles as a strong ETag. Legacy uuid
+# names fall back to revalidation on every use. With `pdf.accel_redirect`
+# enabled, nginx serves the bytes (ranges included) from its internal
+# location and the worker only sets headers.
+PDF_IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
 @app.route("/pdf")
 def pdf():
     directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'pdf_sources')
     pdf_file = request.args.get('doc', '41dd8407-7914-4978-a078-8dc597d8fb86.pdf')
-    return send_from_directory(directory, pdf_file)
+    pdf_hash = PdfBlobStore.hash_of(pdf_file)
+    pdf_config = app_config.section('pdf')
+
+    if pdf_config.get('accel_redirect', False):
+        if not pdf_file.endswith('.pdf') or os.path.basename(pdf_file) != pdf_file:
+            return "Not found", 404
+        if pdf_hash and request.if_none_match.contains(pdf_hash):
+            response = Response(status=304)
+        else:
+            response = Response(mimetype="application/pdf")
+            response.headers["X-Accel-Redirect"] = pdf_config.get('accel_prefix', '/protected-pdfs/') + pdf_file
+        if pdf_hash:
+            response.set_etag(pdf_hash)
+            response.headers["Cache-Control"] = PDF_IMMUTABLE_CACHE
+        return response
+
+    # conditional=True answers Range and If-None-Match requests.
+    if pdf_hash:
+        response = send_from_directory(directory, pdf_file, etag=pdf_hash, conditional=True,
+                                       mimetype="application/pdf")
+        response.headers["Cache-Control"] = PDF_IMMUTABLE_CACHE
+        return response
+    response = send_from_directory(directory, pdf_file, conditional=True, mimetype="application/pdf", max_age=0)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", debug=True)
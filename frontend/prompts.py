@@ -18,3 +18,52 @@ Return the answer in JSON format following the schema below EXACTLY:
 Ensure that your output is valid JSON and nothing else.
 """
     return prompt.strip()
+
+def build_pages_prompt(user_message: str, pages) -> str:
+    """
+    Build the prompt for answering from retrieved page excerpts instead of the
+    whole PDF. `pages` is a list of (page_number, text) pairs; the model is
+    asked to cite one of those page numbers.
+    """
+    excerpts = "\n\n".join(f"[Page {number}]\n{text}" for number, text in pages)
+    page_numbers = ", ".join(str(number) for number, _ in pages)
+    prompt = f"""
+{user_message}
+
+Below are the pages of a PDF document that are most relevant to the query above.
+Based on these pages, please provide a detailed answer to the query.
+
+{excerpts}
+
+Return the answer in JSON format following the schema below EXACTLY:
+
+{{
+  "response": "<Your answer as text>",
+  "page": <The page number, one of {page_numbers}, that best supports the answer>
+}}
+
+Ensure that your output is valid JSON and nothing else.
+"""
+    return prompt.strip()
+
+def build_stream_prompt(user_message: str, pages=None) -> str:
+    """
+    Build the prompt for streamed answers. The answer is plain Markdown so it
+    can be rendered as it arrives; the page reference is supplied separately
+    from retrieval. `pages` holds (page_number, text) excerpts, or None when
+    the whole PDF accompanies the prompt.
+    """
+    if pages:
+        excerpts = "\n\n".join(f"[Page {number}]\n{text}" for number, text in pages)
+        source = f"Below are the pages of a PDF document that are most relevant to the query above.\n\n{excerpts}"
+    else:
+        source = "The PDF document is provided along with this query."
+    prompt = f"""
+{user_message}
+
+{source}
+
+Based on the content of the document, please provide a detailed answer to the query.
+Write the answer as plain Markdown text. Do not wrap it in JSON or code fences.
+"""
+    return prompt.strip()
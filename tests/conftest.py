@@ -0,0 +1,6 @@
+import os
+import sys
+
+# backend/, LLM/ and common/ are imported as top-level packages from the
+# project root, as the services do.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
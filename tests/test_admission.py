@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.admission import AdmissionLimit, Overloaded, SingleFlight
+
+def test_limit_queues_then_rejects():
+    async def scenario():
+        limit = AdmissionLimit("test", max_concurrent=1, max_waiting=1, wait_seconds=5, retry_after=7)
+        await limit.acquire()
+        waiter = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        assert limit.snapshot()["waiting"] == 1
+        with pytest.raises(Overloaded) as rejected:
+            await limit.acquire()
+        assert rejected.value.retry_after == 7
+        limit.release()
+        await waiter
+        assert limit.snapshot()["running"] == 1
+        limit.release()
+
+    asyncio.run(scenario())
+
+def test_wait_times_out():
+    async def scenario():
+        limit = AdmissionLimit("test", max_concurrent=1, max_waiting=4, wait_seconds=0.05)
+        await limit.acquire()
+        with pytest.raises(Overloaded):
+            await limit.acquire()
+        assert limit.snapshot()["waiting"] == 0
+
+    asyncio.run(scenario())
+
+def test_single_flight_shares_one_thread_call():
+    flight = SingleFlight("test")
+    calls = []
+    started = threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.1)
+        return value * 2
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow, 2)))
+    leader.start()
+    started.wait(1)
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", slow, 2)))
+    follower.start()
+    leader.join()
+    follower.join()
+    assert results == [4, 4]
+    assert calls == [2]
+    # Nothing is cached once the call has finished.
+    assert flight.do("k", slow, 3) == 6
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(flight.ado("k", failing), flight.ado("k", failing), return_exceptions=True)
+        assert [str(r) for r in results] == ["boom", "boom"]
+
+    asyncio.run(scenario())
+    assert calls == [1]
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.ado("k", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.ado("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+
+    asyncio.run(scenario())
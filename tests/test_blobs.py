@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+from backend.blobs import PdfBlobStore
+from backend.store import SqliteDocumentStore
+
+PDF = b"%PDF-1.4 test document"
+PDF_HASH = hashlib.sha256(PDF).hexdigest()
+
+def write_tmp(tmp_path, name="upload"):
+    path = tmp_path / f".{name}.pdf.tmp"
+    path.write_bytes(PDF)
+    return str(path)
+
+def make_blobs(tmp_path):
+    store = SqliteDocumentStore(str(tmp_path / "documents.db"))
+    return store, PdfBlobStore(str(tmp_path), store)
+
+def test_put_names_blob_by_bytes_and_dedupes(tmp_path):
+    _, blobs = make_blobs(tmp_path)
+    first = write_tmp(tmp_path, "a")
+    assert blobs.hash_file(first) == PDF_HASH
+    assert blobs.put(first, PDF_HASH, holder="a") == f"{PDF_HASH}.pdf"
+    second = write_tmp(tmp_path, "b")
+    assert blobs.put(second, PDF_HASH, holder="b") == f"{PDF_HASH}.pdf"
+    assert not os.path.exists(second)
+    assert PdfBlobStore.hash_of(f"{PDF_HASH}.pdf") == PDF_HASH
+    assert PdfBlobStore.hash_of("41dd8407-7914-4978-a078-8dc597d8fb86.pdf") is None
+
+def test_pending_upload_keeps_blob(tmp_path):
+    store, blobs = make_blobs(tmp_path)
+    pdf_file = blobs.put(write_tmp(tmp_path), PDF_HASH, holder="queued-upload")
+    # Another process deletes the only stored document using the same PDF
+    # while the upload's job is still queued.
+    other = PdfBlobStore(str(tmp_path), store)
+    assert not other.release(pdf_file)
+    assert os.path.exists(blobs.path(pdf_file))
+
+    store.put({"id": "queued-upload", "url": "local://x", "pdf_file": pdf_file, "content_hash": PDF_HASH})
+    blobs.settle(pdf_file, "queued-upload")
+    assert not other.release(pdf_file)
+
+    store.delete("queued-upload")
+    assert other.release(pdf_file)
+    assert not os.path.exists(blobs.path(pdf_file))
+
+def test_abandoned_blob_is_released(tmp_path):
+    _, blobs = make_blobs(tmp_path)
+    pdf_file = blobs.put(write_tmp(tmp_path), PDF_HASH, holder="failed")
+    blobs.settle(pdf_file, "failed")
+    assert blobs.release(pdf_file)
+
+def test_stale_pending_reference_is_ignored(tmp_path):
+    store, blobs = make_blobs(tmp_path)
+    pdf_file = blobs.put(write_tmp(tmp_path), PDF_HASH, holder="crashed")
+    assert PdfBlobStore(str(tmp_path), store, pending_ttl_seconds=0).release(pdf_file)
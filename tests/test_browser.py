@@ -0,0 +1,62 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from backend.browser import BrowserPool, PageCaptureError
+
+class FakePool(BrowserPool):
+    """
+    Workers named in `broken` fail to start once `release` is set; the
+    others start after them and 'render' by writing the URL to the PDF path.
+    """
+
+    def __init__(self, broken, **options):
+        super().__init__(**options)
+        self.broken = broken
+        self.release = threading.Event()
+
+    def _serve(self):
+        self.release.wait(5)
+        if threading.current_thread().name in self.broken:
+            raise RuntimeError("chromium failed to launch")
+        while any(t.name in self.broken and t.is_alive() for t in threading.enumerate()):
+            time.sleep(0.01)
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            url, pdf_path, future = task
+            if future.set_running_or_notify_cancel():
+                with open(pdf_path, "w") as f:
+                    f.write(url)
+                future.set_result(("hash", url))
+
+def queue_captures(pool, tmp_path, count):
+    futures = []
+    for i in range(count):
+        future = Future()
+        pool._tasks.put((f"https://example.org/{i}", str(tmp_path / f"{i}.pdf"), future))
+        futures.append(future)
+    return futures
+
+def test_healthy_worker_serves_queue_when_another_dies(tmp_path):
+    pool = FakePool({"browser-pool-0"}, size=2)
+    pool.start()
+    futures = queue_captures(pool, tmp_path, 4)
+    pool.release.set()
+    try:
+        assert [f.result(5)[1] for f in futures] == [f"https://example.org/{i}" for i in range(4)]
+    finally:
+        pool.close()
+
+def test_queue_fails_when_no_worker_is_left(tmp_path):
+    pool = FakePool({"browser-pool-0"}, size=1)
+    pool.start()
+    futures = queue_captures(pool, tmp_path, 2)
+    pool.release.set()
+    for future in futures:
+        with pytest.raises(PageCaptureError):
+            future.result(5)
+    assert pool._workers == []
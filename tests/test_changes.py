@@ -0,0 +1,31 @@
+from backend.changes import comparable_text_hash, main_text, text_hash
+
+ARTICLE = "<p>" + "Proto-danksharding adds blob-carrying transactions to Ethereum. " * 5 + "</p>"
+
+def page(body):
+    return f"<html><head><title>t</title></head><body><nav>Menu</nav>{body}<footer>f</footer></body></html>"
+
+def test_main_content_preferred_over_chrome():
+    html = page(f"<div>sidebar</div><main>{ARTICLE}</main>")
+    assert "sidebar" not in main_text(html)
+    assert "Menu" not in main_text(html)
+
+def test_volatile_fragments_ignored():
+    assert text_hash(page(ARTICLE + "<p>Updated 5 minutes ago</p>")) == \
+        text_hash(page(ARTICLE + "<p>Updated 7 minutes ago</p>"))
+
+def test_changed_text_changes_hash():
+    assert comparable_text_hash(page(ARTICLE)) != comparable_text_hash(page(ARTICLE + "<p>New section</p>"))
+
+def test_js_rendered_page_is_not_comparable():
+    # Only a <noscript> fallback and an empty mount point before rendering:
+    # the text would hash the same whatever the page says.
+    first = page('<noscript>Proto-danksharding explained</noscript><div id="root"></div>')
+    second = page('<noscript>Validator withdrawals explained</noscript><div id="root"></div>')
+    assert text_hash(first) == text_hash(second)
+    assert comparable_text_hash(first) is None
+    assert comparable_text_hash(second) is None
+
+def test_short_text_is_not_comparable():
+    assert comparable_text_hash(page("<p>Loading...</p>")) is None
+    assert comparable_text_hash(page("<p>Loading...</p>"), min_chars=0) is not None
@@ -0,0 +1,68 @@
+import json
+import os
+
+from backend.crawl import CHECKPOINT_FILE, Checkpoint, crawl_maps
+from backend.map import DELTA_FILE, MAP_FILE
+
+def write_map(storage_path, urls, delta=None):
+    source_dir = os.path.join(storage_path, "maps", "example.org")
+    os.makedirs(source_dir, exist_ok=True)
+    with open(os.path.join(source_dir, MAP_FILE), "w") as f:
+        json.dump({"links": urls}, f)
+    if delta is not None:
+        with open(os.path.join(source_dir, DELTA_FILE), "w") as f:
+            json.dump(delta, f)
+    return source_dir
+
+def recorder(seen):
+    def process(url):
+        seen.append(url)
+        return "added", "ok"
+    return process
+
+def test_completed_crawl_is_not_skipped_next_time(tmp_path):
+    write_map(str(tmp_path), ["https://example.org/a", "https://example.org/b"])
+    seen = []
+    crawl_maps(recorder(seen), str(tmp_path), retries=0)
+    crawl_maps(recorder(seen), str(tmp_path), retries=0)
+    assert sorted(seen) == ["https://example.org/a"] * 2 + ["https://example.org/b"] * 2
+
+def test_interrupted_run_resumes_unless_fresh(tmp_path):
+    source_dir = write_map(str(tmp_path), ["https://example.org/a", "https://example.org/b"])
+    path = os.path.join(source_dir, CHECKPOINT_FILE)
+    checkpoint = Checkpoint(path, run_id="full:1")
+    checkpoint.record("https://example.org/a", "added", "ok", 1)
+    checkpoint.flush()
+
+    assert Checkpoint(path, run_id="full:1").is_done("https://example.org/a")
+    assert not Checkpoint(path, run_id="full:2").is_done("https://example.org/a")
+    assert not Checkpoint(path, run_id="full:1", fresh=True).is_done("https://example.org/a")
+
+def test_legacy_checkpoint_is_ignored(tmp_path):
+    source_dir = write_map(str(tmp_path), ["https://example.org/a"])
+    with open(os.path.join(source_dir, CHECKPOINT_FILE), "w") as f:
+        json.dump({"https://example.org/a": {"status": "added"}}, f)
+    seen = []
+    crawl_maps(recorder(seen), str(tmp_path), retries=0)
+    assert seen == ["https://example.org/a"]
+
+def test_delta_crawl_removes_and_forgets_dropped_urls(tmp_path):
+    delta = {"mapped_at": "t1", "added": ["https://example.org/c"], "removed": ["https://example.org/b"]}
+    write_map(str(tmp_path), ["https://example.org/a", "https://example.org/c"], delta)
+    seen, removed = [], []
+    results = crawl_maps(recorder(seen), str(tmp_path), delta=True, retries=0,
+                         remove=lambda url: removed.append(url) or True)
+    assert seen == ["https://example.org/c"]
+    assert removed == ["https://example.org/b"]
+    assert results["example.org"]["removed"] == 1
+
+def test_delta_crawl_consumes_delta(tmp_path):
+    delta = {"mapped_at": "t1", "added": ["https://example.org/a", "https://example.org/b"], "removed": []}
+    source_dir = write_map(str(tmp_path), ["https://example.org/a", "https://example.org/b"], delta)
+
+    def process(url):
+        return ("added", "ok") if url.endswith("/a") else ("error", "unreachable")
+
+    crawl_maps(process, str(tmp_path), delta=True, retries=0)
+    with open(os.path.join(source_dir, DELTA_FILE)) as f:
+        assert json.load(f)["added"] == ["https://example.org/b"]
@@ -0,0 +1,70 @@
+from backend.index import DocumentIndex, tokenize
+
+def make_doc(doc_id, title="", description="", tags=(), authors=()):
+    return {"id": doc_id, "title": title, "description": description, "tags": list(tags), "authors": list(authors)}
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+def test_tokenize():
+    assert tokenize("EIP-4844: Proto-Danksharding!") == ["eip", "4844", "proto", "danksharding"]
+
+def test_search_ranks_matching_documents():
+    index = DocumentIndex()
+    index.add(make_doc("blobs", title="Proto-danksharding blobs", description="Blob transactions for rollups."))
+    index.add(make_doc("staking", title="Staking", description="Validators and withdrawals."))
+    index.add(make_doc("rollups", title="Rollups", description="Rollups post data as blobs."))
+    assert ids(index.search("blobs")) == ["blobs", "rollups"]
+    assert index.search("unrelated words") == []
+    assert index.search("") == []
+
+def test_title_outweighs_description():
+    index = DocumentIndex()
+    index.add(make_doc("in-description", title="Scaling", description="Notes on danksharding."))
+    index.add(make_doc("in-title", title="Danksharding", description="Notes on scaling."))
+    assert ids(index.search("danksharding")) == ["in-title", "in-description"]
+
+def test_tags_and_authors_are_indexed():
+    index = DocumentIndex()
+    index.add(make_doc("a", tags=["mev"], authors=["Vitalik Buterin"]))
+    index.add(make_doc("b", description="Something else"))
+    assert ids(index.search("mev")) == ["a"]
+    assert ids(index.search("buterin")) == ["a"]
+
+def test_rare_terms_count_more():
+    index = DocumentIndex()
+    index.add(make_doc("common", description="ethereum ethereum"))
+    index.add(make_doc("both", description="ethereum verkle"))
+    index.add(make_doc("other", description="ethereum"))
+    assert ids(index.search("ethereum verkle"))[0] == "both"
+
+def test_top_k():
+    index = DocumentIndex()
+    for i in range(5):
+        index.add(make_doc(f"d{i}", title="gas"))
+    assert len(index.search("gas", top_k=3)) == 3
+
+def test_update_replaces_terms():
+    index = DocumentIndex()
+    index.add(make_doc("a", title="Old title"))
+    index.add(make_doc("a", title="New heading"))
+    assert len(index) == 1
+    assert index.search("old") == []
+    assert ids(index.search("heading")) == ["a"]
+
+def test_remove():
+    index = DocumentIndex()
+    index.add(make_doc("a", title="Gas"))
+    index.add(make_doc("b", title="Gas fees"))
+    index.remove("a")
+    index.remove("missing")
+    assert "a" not in index
+    assert ids(index.search("gas")) == ["b"]
+
+def test_rebuild_replaces_contents():
+    index = DocumentIndex()
+    index.add(make_doc("a", title="Gas"))
+    index.rebuild([make_doc("b", title="Gas"), make_doc("c", title="Blobs")])
+    assert len(index) == 2
+    assert ids(index.search("gas")) == ["b"]
+    assert ids(index.search("blobs")) == ["c"]
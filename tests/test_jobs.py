@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from backend.jobs import DONE, ERROR, QUEUED, RUNNING, JobQueue
+
+def wait_for(queue, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {queue.get(job_id)['status']}, expected {status}")
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(**options):
+        queue = JobQueue(str(tmp_path / "jobs.db"), **options)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+def test_job_runs_and_records_result_and_stage(make_queue):
+    queue = make_queue()
+    stages = []
+
+    def handler(params, progress):
+        progress("working")
+        stages.append(queue.get(job_id)["stage"])
+        return {"doubled": params["n"] * 2}
+
+    queue.register("double", handler)
+    job_id = queue.submit("double", {"n": 21})["id"]
+    job = wait_for(queue, job_id, DONE)
+    assert job["result"] == {"doubled": 42}
+    assert job["stage"] == "done"
+    assert stages == ["working"]
+
+def test_failed_job_records_error(make_queue):
+    queue = make_queue()
+
+    def handler(params, progress):
+        raise RuntimeError("boom")
+
+    queue.register("fail", handler)
+    job = wait_for(queue, queue.submit("fail", {})["id"], ERROR)
+    assert job["error"] == "boom"
+
+def test_unknown_kind_is_rejected(make_queue):
+    with pytest.raises(ValueError):
+        make_queue().submit("nope", {})
+
+def test_job_is_claimed_once(make_queue):
+    release = threading.Event()
+    first, second = make_queue(), make_queue()
+    first.register("block", lambda params, progress: release.wait(5))
+    second.register("block", lambda params, progress: release.wait(5))
+    job_id = first.submit("block", {})["id"]
+    wait_for(first, job_id, RUNNING)
+    assert not second._claim(job_id)
+    release.set()
+    wait_for(first, job_id, DONE)
+    assert not second._claim(job_id)
+
+def test_stale_running_job_is_claimed_again(make_queue):
+    queue = make_queue(lease_seconds=0.2)
+    queue.register("work", lambda params, progress: "ok")
+    # A job left running by a process that stopped sending heartbeats.
+    queue._conn().execute(
+        "INSERT INTO jobs (id, kind, params, status, created_at, updated_at, owner, heartbeat)"
+        " VALUES ('stale', 'work', '{}', ?, '', '', 'gone', ?)",
+        (RUNNING, time.time()),
+    )
+    assert not queue._claim("stale")
+    time.sleep(0.3)
+    assert queue.resume() == 1
+    assert wait_for(queue, "stale", DONE)["result"] == "ok"
+
+def test_resume_picks_up_queued_jobs(make_queue):
+    queue = make_queue()
+    queue.register("work", lambda params, progress: params["n"])
+    queue._conn().execute(
+        "INSERT INTO jobs (id, kind, params, status, created_at, updated_at)"
+        " VALUES ('left', 'work', '{\"n\": 7}', ?, '', '')",
+        (QUEUED,),
+    )
+    assert queue.depth() == 1
+    assert queue.resume() == 1
+    assert wait_for(queue, "left", DONE)["result"] == 7
+    assert queue.depth() == 0
+
+def test_finished_history_is_pruned(make_queue):
+    queue = make_queue(max_history=2)
+    queue.register("work", lambda params, progress: params["n"])
+    for n in range(4):
+        wait_for(queue, queue.submit("work", {"n": n})["id"], DONE)
+    assert len(queue.list(status=DONE)) == 2
@@ -0,0 +1,90 @@
+import time
+
+from LLM.cache import CachedLLMService, LLMCache, content_hash, make_key, sha256_text
+
+def test_content_hash_reads_files(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF bytes")
+    assert content_hash(str(path)) == content_hash(b"%PDF bytes")
+    assert content_hash("plain text") == sha256_text("plain text")
+
+def test_memory_then_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.db")
+    LLMCache(path).set("k", {"summary": "s"})
+    cache = LLMCache(path)
+    assert cache.get("k") == {"summary": "s"}
+    assert cache.get("k") == {"summary": "s"}
+    assert cache.get("other") is None
+    stats = cache.snapshot()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), ttl_seconds=0.05)
+    cache.set("k", "v")
+    time.sleep(0.1)
+    assert cache.get("k") is None
+
+def test_disk_size_limit_evicts_least_recently_used(tmp_path):
+    # Each value is 12 bytes of JSON; eviction goes down to 27 of 30 bytes.
+    cache = LLMCache(str(tmp_path / "cache.db"), memory_items=1, max_disk_bytes=30)
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 10)
+    cache.get("a")
+    cache.set("c", "z" * 10)
+    fresh = LLMCache(cache.path, max_disk_bytes=30)
+    assert fresh.get("b") is None
+    assert fresh.get("a") == "x" * 10
+    assert fresh.get("c") == "z" * 10
+    assert cache.snapshot()["evictions"] == 1
+
+def test_running_total_tracks_replaced_entries(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_disk_bytes=1000)
+    cache.set("a", "x" * 10)
+    cache.set("a", "x" * 20)
+    cache.set("b", "y" * 10)
+    assert cache._disk_bytes == 22 + 12
+
+class CountingService:
+    model = "m1"
+
+    def __init__(self):
+        self.calls = 0
+
+    def summarize(self, input_str):
+        self.calls += 1
+        return f"summary of {input_str}"
+
+    def generate_metadata(self, input_str):
+        self.calls += 1
+        return {"title": input_str}
+
+    def analyze(self, input_str, fallback=False):
+        self.calls += 1
+        return {"summary": "fallback" if fallback else "primary"}
+
+def test_cached_service_keys_by_operation_and_prompt(tmp_path):
+    service = CountingService()
+    cache = LLMCache(str(tmp_path / "cache.db"))
+    cached = CachedLLMService(service, cache, "dummy", {"summarize": "S: {x}", "generate_metadata": "M: {x}"})
+    assert cached.summarize("text") == "summary of text"
+    assert cached.summarize("text") == "summary of text"
+    assert cached.generate_metadata("text") == {"title": "text"}
+    assert service.calls == 2
+    assert cached.model == "m1"
+
+    changed = CachedLLMService(service, cache, "dummy", {"summarize": "S2: {x}"})
+    changed.summarize("text")
+    assert service.calls == 3
+
+def test_make_key_depends_on_every_part():
+    base = make_key("p", "m", "prompt", "h")
+    assert len({base, make_key("q", "m", "prompt", "h"), make_key("p", "n", "prompt", "h"),
+                make_key("p", "m", "other", "h"), make_key("p", "m", "prompt", "i")}) == 5
+
+def test_fallback_answers_are_cached_separately(tmp_path):
+    service = CountingService()
+    cached = CachedLLMService(service, LLMCache(str(tmp_path / "cache.db")), "dummy", {"analyze": "A: {x}"})
+    assert cached.analyze("text", fallback=True) == {"summary": "fallback"}
+    assert cached.analyze("text") == {"summary": "primary"}
+    assert cached.analyze("text", fallback=True) == {"summary": "fallback"}
+    assert service.calls == 2
@@ -0,0 +1,72 @@
+import json
+import os
+
+from backend.map import DELTA_FILE, consume_delta, map_sources, source_dir_name
+
+class FakeFirecrawl:
+    """Stands in for FirecrawlApp; map_url returns the next queued site map."""
+
+    def __init__(self, *maps):
+        self.maps = list(maps)
+
+    def map_url(self, source):
+        return {"links": self.maps.pop(0)}
+
+SOURCE = "https://example.org/docs"
+
+def read_delta(storage_path):
+    with open(os.path.join(storage_path, "maps", source_dir_name(SOURCE), DELTA_FILE)) as f:
+        return json.load(f)
+
+def test_first_run_adds_every_url(tmp_path):
+    app = FakeFirecrawl(["https://example.org/a", "https://example.org/b"])
+    results = map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    assert results[SOURCE] == {"links": 2, "added": 2, "removed": 0}
+    delta = read_delta(str(tmp_path))
+    assert delta["first_run"]
+    assert delta["added"] == ["https://example.org/a", "https://example.org/b"]
+
+def test_diff_against_previous_map(tmp_path):
+    app = FakeFirecrawl(["https://example.org/a", "https://example.org/b"],
+                        ["https://example.org/b", "https://example.org/c"])
+    map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    consume_delta(os.path.join(str(tmp_path), "maps", source_dir_name(SOURCE)),
+                  {"https://example.org/a", "https://example.org/b"}, set())
+    map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    delta = read_delta(str(tmp_path))
+    assert not delta["first_run"]
+    assert delta["added"] == ["https://example.org/c"]
+    assert delta["removed"] == ["https://example.org/a"]
+
+def test_deltas_accumulate_until_crawled(tmp_path):
+    app = FakeFirecrawl(["https://example.org/a"],
+                        ["https://example.org/a", "https://example.org/b"],
+                        ["https://example.org/a", "https://example.org/b", "https://example.org/c"])
+    for _ in range(3):
+        map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    assert read_delta(str(tmp_path))["added"] == [
+        "https://example.org/a", "https://example.org/b", "https://example.org/c"]
+
+    source_dir = os.path.join(str(tmp_path), "maps", source_dir_name(SOURCE))
+    consume_delta(source_dir, {"https://example.org/a", "https://example.org/c"}, set())
+    assert read_delta(str(tmp_path))["added"] == ["https://example.org/b"]
+
+def test_added_then_removed_before_crawl_cancels(tmp_path):
+    app = FakeFirecrawl(["https://example.org/a"],
+                        ["https://example.org/a", "https://example.org/b"],
+                        ["https://example.org/a"])
+    map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    consume_delta(os.path.join(str(tmp_path), "maps", source_dir_name(SOURCE)), {"https://example.org/a"}, set())
+    map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    delta = read_delta(str(tmp_path))
+    assert delta["added"] == []
+    assert delta["removed"] == ["https://example.org/b"]
+
+def test_empty_map_keeps_previous(tmp_path):
+    app = FakeFirecrawl(["https://example.org/a"], [])
+    map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    results = map_sources([SOURCE], str(tmp_path), "UNUSED", app=app)
+    assert "no links" in results[SOURCE]["error"]
+    assert read_delta(str(tmp_path))["added"] == ["https://example.org/a"]
+    assert read_delta(str(tmp_path))["removed"] == []
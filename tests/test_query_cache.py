@@ -0,0 +1,53 @@
+from backend.query_cache import QueryCache, query_terms
+
+def test_terms_drop_stopwords_and_punctuation():
+    assert query_terms("What is Danksharding?") == query_terms("danksharding")
+    assert query_terms("what is it") == frozenset(["what", "is", "it"])
+
+def test_exact_and_near_hits():
+    cache = QueryCache(similarity=0.5)
+    cache.get("proto danksharding blobs", "v1")
+    cache.set("proto danksharding blobs", "v1", ["doc-a"])
+    assert cache.get("Blobs, proto danksharding?", "v1") == ["doc-a"]
+    assert cache.get("proto danksharding blobs fees", "v1") == ["doc-a"]
+    assert cache.get("validator withdrawals", "v1") is None
+    stats = cache.snapshot()
+    assert (stats["hits"], stats["near_hits"], stats["misses"]) == (1, 1, 2)
+
+def test_near_matching_can_be_disabled():
+    cache = QueryCache(similarity=1)
+    cache.get("proto danksharding blobs", "v1")
+    cache.set("proto danksharding blobs", "v1", ["doc-a"])
+    assert cache.get("proto danksharding blobs fees", "v1") is None
+
+def test_new_version_drops_everything():
+    cache = QueryCache()
+    cache.get("staking", "v1")
+    cache.set("staking", "v1", ["doc-a"])
+    assert cache.get("staking", "v2") is None
+    assert cache.snapshot()["invalidations"] == 1
+
+def test_stale_result_is_not_stored():
+    cache = QueryCache()
+    cache.get("staking", "v1")
+    cache.get("other", "v2")
+    cache.set("staking", "v1", ["doc-a"])
+    assert cache.get("staking", "v2") is None
+
+def test_scopes_are_separate():
+    cache = QueryCache(similarity=0.5)
+    cache.get("staking", "v1", scope="a")
+    cache.set("staking", "v1", ["doc-a"], scope="a")
+    assert cache.get("staking", "v1", scope="b") is None
+    assert cache.get("staking", "v1", scope="a") == ["doc-a"]
+
+def test_least_recently_used_is_evicted():
+    cache = QueryCache(max_items=2, similarity=1)
+    cache.get("one", "v1")
+    for query in ("one", "two"):
+        cache.set(query, "v1", [query])
+    cache.get("one", "v1")
+    cache.set("three", "v1", ["three"])
+    assert cache.get("two", "v1") is None
+    assert cache.get("one", "v1") == ["one"]
+    assert cache.snapshot()["evictions"] == 1
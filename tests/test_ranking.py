@@ -0,0 +1,59 @@
+import asyncio
+
+from backend.ranking import make_shards, sharded_rank
+
+def make_docs(count, description_chars=400):
+    return [{"id": f"d{i}", "title": f"doc {i}", "description": "x" * description_chars} for i in range(count)]
+
+def quality_ranker(calls):
+    """A ranker that prefers higher-numbered documents and records each call's size."""
+    async def rank(query, shard, top_n):
+        calls.append(len(shard))
+        scored = [(doc["id"], int(doc["id"][1:]) / 1000) for doc in shard]
+        return sorted(scored, key=lambda item: item[1], reverse=True)[:top_n]
+    return rank
+
+def test_shards_respect_budget():
+    docs = make_docs(100)
+    shards = make_shards(docs, budget_tokens=1000, max_chars=500)
+    assert len(shards) > 1
+    assert [doc for shard in shards for doc in shard] == docs
+    assert all(len(shard) >= 1 for shard in shards)
+
+def test_single_shard_is_one_call():
+    calls = []
+    ranked, complete = asyncio.run(sharded_rank("q", make_docs(3), quality_ranker(calls), 2, 100000, 500))
+    assert [doc_id for doc_id, _ in ranked] == ["d2", "d1"]
+    assert complete
+    assert calls == [3]
+
+def test_small_shards_compare_every_document():
+    # Each shard holds a single document (capacity <= top_n), so every
+    # document is a shard winner; later shards must not be dropped.
+    docs = make_docs(12)
+    calls = []
+    ranked, complete = asyncio.run(sharded_rank("q", docs, quality_ranker(calls), 5, 150, 500))
+    assert [doc_id for doc_id, _ in ranked] == ["d11", "d10", "d9", "d8", "d7"]
+
+def test_two_rounds_regardless_of_corpus_size():
+    # Shards hold a little more than top_n documents.
+    docs = make_docs(300)
+    calls = []
+    ranked, complete = asyncio.run(sharded_rank("q", docs, quality_ranker(calls), 5, 900, 500))
+    shards = make_shards(docs, 900, 500)
+    assert len(calls) == len(shards) + 1
+    assert [doc_id for doc_id, _ in ranked] == ["d299", "d298", "d297", "d296", "d295"]
+    assert complete
+
+def test_failed_shard_is_skipped():
+    docs = make_docs(40)
+
+    async def rank(query, shard, top_n):
+        if any(doc["id"] == "d39" for doc in shard) and len(shard) < len(docs):
+            raise RuntimeError("shard failed")
+        return [(doc["id"], 0.5) for doc in shard[:top_n]]
+
+    ranked, complete = asyncio.run(sharded_rank("q", docs, rank, 3, 1500, 500))
+    assert ranked and "d39" not in [doc_id for doc_id, _ in ranked]
+    # A partial ranking must not be cached as if it were complete.
+    assert not complete
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from backend.store import JsonDocumentStore, SqliteDocumentStore, open_store
+
+def make_doc(doc_id, url=None, **fields):
+    return {"id": doc_id, "url": url or f"https://example.org/{doc_id}", "pdf_file": f"{doc_id}.pdf",
+            "content_hash": f"h-{doc_id}", "tags": [], **fields}
+
+@pytest.fixture(params=["sqlite", "json"])
+def store(request, tmp_path):
+    return open_store({"document_store": request.param}, str(tmp_path))
+
+def test_put_get_and_lookups(store):
+    store.put(make_doc("a", tags=["eip", "pos"]))
+    store.put(make_doc("b", content_hash="shared", pdf_file="shared.pdf"))
+    store.put(make_doc("c", content_hash="shared", pdf_file="shared.pdf"))
+
+    assert store.get("a")["tags"] == ["eip", "pos"]
+    assert store.find_by_url("https://example.org/b")["id"] == "b"
+    assert sorted(d["id"] for d in store.find_by_hash("shared")) == ["b", "c"]
+    assert [d["id"] for d in store.find_by_tag("pos")] == ["a"]
+    assert store.count_pdf_refs("shared.pdf") == 2
+    assert [d["id"] for d in store.get_many(["c", "missing", "a"])] == ["c", "a"]
+    assert len(store) == 3
+
+def test_update_replaces_url_and_tags(store):
+    store.put(make_doc("a", tags=["old"]))
+    store.put(make_doc("a", url="https://example.org/moved", tags=["new"]))
+    assert store.find_by_url("https://example.org/a") is None
+    assert store.find_by_url("https://example.org/moved")["id"] == "a"
+    assert store.find_by_tag("old") == []
+    assert len(store) == 1
+
+def test_delete(store):
+    store.put(make_doc("a"))
+    assert store.delete("a")["id"] == "a"
+    assert store.delete("a") is None
+    assert store.get("a") is None
+    assert store.count_pdf_refs("a.pdf") == 0
+
+def test_version_changes_on_write(store):
+    before = store.version()
+    store.put(make_doc("a"))
+    assert store.version() != before
+
+def test_change_log(store):
+    start = store.last_change()
+    store.put(make_doc("a"))
+    store.put_many([make_doc("b"), make_doc("a")])
+    store.delete("b")
+    latest, changed = store.changes_since(start)
+    assert latest == store.last_change()
+    assert changed == ["a", "b"]
+    assert store.changes_since(latest) == (latest, [])
+
+def test_sqlite_reader_behind_log_reloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(SqliteDocumentStore, "CHANGE_LOG_SIZE", 2)
+    store = SqliteDocumentStore(str(tmp_path / "documents.db"))
+    for doc_id in "abcd":
+        store.put(make_doc(doc_id))
+    assert store.changes_since(0) == (4, None)
+    assert store.changes_since(2) == (4, ["c", "d"])
+
+def test_sqlite_changes_seen_by_another_connection(tmp_path):
+    path = str(tmp_path / "documents.db")
+    writer, reader = SqliteDocumentStore(path), SqliteDocumentStore(path)
+    version = reader.version()
+    writer.put(make_doc("a"))
+    assert reader.version() != version
+    assert reader.changes_since(0) == (1, ["a"])
+
+def test_json_migrated_once(tmp_path):
+    json_path = tmp_path / "documents.json"
+    json_path.write_text(json.dumps({"a": make_doc("a", tags=["eip"])}))
+    store = open_store({}, str(tmp_path))
+    assert [d["id"] for d in store.find_by_tag("eip")] == ["a"]
+
+    store.delete("a")
+    reopened = open_store({}, str(tmp_path))
+    assert reopened.get("a") is None
+
+def test_json_store_reloads_after_external_write(tmp_path):
+    path = str(tmp_path / "documents.json")
+    first, second = JsonDocumentStore(path), JsonDocumentStore(path)
+    seq = second.last_change()
+    first.put(make_doc("a"))
+    second.version()
+    assert second.get("a")["id"] == "a"
+    assert second.changes_since(seq)[1] is None
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        open_store({"document_store": "redis"}, str(tmp_path))